@@ -0,0 +1,95 @@
+import numpy as np
+
+from svd_scorer import top_k_indices
+
+
+class IVFIndex:
+    # Inverted-file index for maximum inner product search. Item vectors are
+    # clustered with k-means; a query only scans the items in the n_probe
+    # lists whose centroids score highest against it.
+    def __init__(self, centroids, order, offsets, vectors, n_probe=8, query_scale=None):
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+        self.vectors = vectors
+        self.n_probe = n_probe
+        self.query_scale = query_scale
+
+    @classmethod
+    def from_scorer(cls, scorer, movie_ids, **kwargs):
+        # [qi, bi] against a [pu, 1] query ranks items exactly like the SVD
+        # estimate, since the global mean and user bias are shared by all
+        # items. The bias column is stretched to the spread of the factors so
+        # k-means does not ignore it, and the query is shrunk to compensate.
+        _, _, catalog_qi, catalog_bi = scorer.bind_catalog(movie_ids)
+        bias_std = catalog_bi.std()
+        scale = np.sqrt((catalog_qi ** 2).sum(axis=1).mean()) / bias_std if bias_std > 0 else 1.0
+        vectors = np.hstack([catalog_qi, catalog_bi[:, None] * scale])
+        query_scale = np.ones(vectors.shape[1], dtype=np.float32)
+        query_scale[-1] = 1.0 / scale
+        return cls.build(vectors, query_scale=query_scale, **kwargs)
+
+    @classmethod
+    def build(cls, vectors, n_lists=None, n_probe=8, n_iter=10, sample_size=50000, seed=42, query_scale=None):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        n = len(vectors)
+        if n_lists is None:
+            n_lists = int(np.sqrt(n))
+        n_lists = max(1, min(n_lists, n))
+        rng = np.random.default_rng(seed)
+
+        sample = vectors[rng.choice(n, min(n, sample_size), replace=False)]
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+        for _ in range(n_iter):
+            assignment = cls._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            counts = np.bincount(assignment, minlength=n_lists)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+
+        assignment = cls._assign(vectors, centroids)
+        order = np.argsort(assignment, kind='stable').astype(np.int32)
+        offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignment, minlength=n_lists), out=offsets[1:])
+        return cls(centroids, order, offsets, vectors, n_probe, query_scale)
+
+    @staticmethod
+    def _assign(vectors, centroids, chunk_size=8192):
+        half_norms = 0.5 * np.einsum('ij,ij->i', centroids, centroids)
+        assignment = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), chunk_size):
+            block = vectors[start:start + chunk_size] @ centroids.T - half_norms
+            assignment[start:start + chunk_size] = block.argmax(axis=1)
+        return assignment
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    def search(self, query, n_candidates, n_probe=None):
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+        query = np.asarray(query, dtype=np.float32)
+        if self.query_scale is not None:
+            query = query * self.query_scale
+        lists = top_k_indices(self.centroids @ query, n_probe)
+        rows = np.concatenate([self.order[self.offsets[l]:self.offsets[l + 1]] for l in lists])
+        if len(rows) <= n_candidates:
+            return rows
+        return rows[top_k_indices(self.vectors[rows] @ query, n_candidates)]
+
+
+def query_vector(scorer, user_id):
+    pu, _ = scorer.user_vector(user_id)
+    return np.append(pu, 1.0)
+
+
+def recall_at_n(scorer, index, movie_ids, user_ids, n=10, n_candidates=None, n_probe=None):
+    n_candidates = n_candidates or n * 10
+    recalls = []
+    for user_id in user_ids:
+        exact, _ = scorer.top_n(user_id, movie_ids, n=n)
+        candidates = index.search(query_vector(scorer, user_id), n_candidates, n_probe)
+        approx, _ = scorer.top_n(user_id, movie_ids, n=n, candidates=candidates)
+        recalls.append(len(np.intersect1d(exact, approx)) / max(len(exact), 1))
+    return float(np.mean(recalls)) if recalls else 0.0
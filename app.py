@@ -1,67 +1,239 @@
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Blueprint, Flask, current_app, has_app_context, render_template, request, jsonify, send_from_directory, g
 from flask_cors import CORS
+from werkzeug.local import LocalProxy
 import json
-import sqlite3
+import math
 import random
+import threading
+import time
 
 from config import Config
-from database import DatabaseManager
-from data_fetcher import TMDBFetcher
-from recommender import HybridRecommender
-from brain_visualizer import BrainVisualizer
+from metrics import REGISTRY, SlowRequestProfiler
+from model_bundle import ModelNotReady
 
-app = Flask(name, static_url_path='', static_folder='.')
-app.config.from_object(Config)
-CORS(app)
+class Services:
+    # Components are built on first use instead of at import, so a worker
+    # that only serves static files or /api/movies/popular never imports
+    # Surprise, scikit-learn or Plotly, and never loads the ratings. Modules
+    # are imported inside the builders for the same reason.
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.RLock()
+        self.components = {}
+        self.profiler = SlowRequestProfiler(
+            threshold_ms=config.PROFILE_SLOW_MS,
+            sample_rate=config.PROFILE_SAMPLE_RATE,
+            directory=config.PROFILE_DIR
+        )
+    
+    def get(self, name):
+        component = self.components.get(name)
+        if component is None:
+            # Re-entrant: building the recommender builds db_manager first.
+            with self.lock:
+                component = self.components.get(name)
+                if component is None:
+                    component = getattr(self, f'build_{name}')()
+                    self.components[name] = component
+        return component
+    
+    def peek(self, name):
+        return self.components.get(name)
+    
+    def build_db_manager(self):
+        from database import DatabaseManager
+        
+        db_manager = DatabaseManager(
+            self.config.DATABASE_PATH,
+            pool_size=self.config.DB_POOL_SIZE,
+            cache_size_kb=self.config.SQLITE_CACHE_SIZE_KB,
+            mmap_size=self.config.SQLITE_MMAP_SIZE
+        )
+        db_manager.migrate()
+        return db_manager
+    
+    def build_fetcher(self):
+        from data_fetcher import TMDBFetcher
+        
+        return TMDBFetcher(self.get('db_manager'))
+    
+    def build_recommender(self):
+        from model_store import ModelStore
+        from recommender import HybridRecommender
+        
+        config = self.config
+        recommender = HybridRecommender(
+            self.get('db_manager'),
+            online_steps=config.ONLINE_SGD_STEPS,
+            online_lr=config.ONLINE_LEARNING_RATE,
+            online_reg=config.ONLINE_REGULARIZATION,
+            retrain_after=config.RETRAIN_AFTER_RATINGS,
+            similarity_top_k=config.SIMILARITY_TOP_K,
+            ann_min_items=config.ANN_MIN_ITEMS,
+            ann_lists=config.ANN_LISTS,
+            ann_probe=config.ANN_PROBE,
+            ann_candidates=config.ANN_CANDIDATES,
+            model_store=ModelStore(config.MODEL_DIR),
+            wave_half_life_days=config.WAVE_HALF_LIFE_DAYS,
+            wave_min_rating=config.WAVE_MIN_RATING,
+            cache_size=config.RECOMMENDATION_CACHE_SIZE,
+            warm_users=config.CACHE_WARM_USERS,
+            warm_n=config.CACHE_WARM_N,
+            training_mode=config.TRAINING_MODE,
+            svd_params=config.SVD_PARAMS,
+            genre_weight=config.HYBRID_GENRE_WEIGHT
+        )
+        recommender.boot()
+        return recommender
+    
+    def build_visualizer(self):
+        from brain_visualizer import BrainVisualizer
+        
+        return BrainVisualizer(
+            self.get('recommender'),
+            cache_size=self.config.BRAIN_CACHE_SIZE,
+            cache_ttl=self.config.BRAIN_CACHE_TTL
+        )
+
+def services():
+    # Outside a request (a shell, a script importing app) the module-level
+    # app's components are used.
+    return (current_app if has_app_context() else app).extensions['cinematic_brain']
+
+db_manager = LocalProxy(lambda: services().get('db_manager'))
+fetcher = LocalProxy(lambda: services().get('fetcher'))
+recommender = LocalProxy(lambda: services().get('recommender'))
+visualizer = LocalProxy(lambda: services().get('visualizer'))
+profiler = LocalProxy(lambda: services().profiler)
+
+api = Blueprint('api', __name__)
+
+def register_metrics(app_services):
+    # Scrapes read components only once something else has built them; an
+    # unbuilt component reports no series rather than being built by /metrics.
+    def built(name, read):
+        return lambda: {} if app_services.peek(name) is None else read(app_services.peek(name))
+    
+    def cache_stat(field):
+        def read():
+            caches = {}
+            if app_services.peek('recommender') is not None:
+                caches['recommendations'] = app_services.peek('recommender').recommendation_cache
+            if app_services.peek('visualizer') is not None:
+                caches['brain_activity'] = app_services.peek('visualizer').activity_cache
+            return {(('cache', name),): cache.stats()[field] for name, cache in caches.items()}
+        return read
+    
+    for field in ('hits', 'misses', 'evictions', 'expirations'):
+        REGISTRY.register(f'cache_{field}_total', 'counter', f'Cache {field}', cache_stat(field))
+    REGISTRY.register('cache_entries', 'gauge', 'Entries held per cache', cache_stat('size'))
+    REGISTRY.register('model_version', 'gauge', 'Version of the published model bundle',
+                      built('recommender', lambda r: r.model_version))
+    REGISTRY.register('model_trained_ratings', 'gauge', 'Ratings the published model was trained on',
+                      built('recommender', lambda r: r.model.trained_rating_count))
+    REGISTRY.register('data_version', 'gauge', 'Table versions of the current data snapshot',
+                      built('recommender', lambda r: {(('table', 'movies'),): r.snapshot.version[0],
+                                                      (('table', 'ratings'),): r.snapshot.version[1]}))
+    REGISTRY.register('snapshot_ratings', 'gauge', 'Ratings held in the current snapshot',
+                      built('recommender', lambda r: len(r.snapshot.ratings)))
+    REGISTRY.register('training_runs_total', 'counter', 'Background training runs started',
+                      built('recommender', lambda r: r.training_status()['runs']))
+    REGISTRY.register('training_in_progress', 'gauge', 'Whether a background training run is active',
+                      built('recommender', lambda r: int(r.training_status()['state'] == 'running')))
+    REGISTRY.register('db_idle_connections', 'gauge', 'Pooled SQLite connections waiting for reuse',
+                      built('db_manager', lambda db: db.pool_stats()['idle']))
+    REGISTRY.register('components_built', 'gauge', 'Whether each lazily built component exists yet',
+                      lambda: {(('component', name),): int(app_services.peek(name) is not None)
+                               for name in ('db_manager', 'fetcher', 'recommender', 'visualizer')})
+
+def model_not_ready(e):
+    # 503 until the first background training run publishes a model.
+    return jsonify({'error': str(e), 'training': e.status}), 503, {'Retry-After': '5'}
+
+def record_exception(e):
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    REGISTRY.inc('http_exceptions_total', labels=(('route', route), ('exception', type(e).__name__)))
+    current_app.logger.exception('%s %s failed', request.method, request.path)
 
-db_manager = DatabaseManager(Config.DATABASE_PATH)
-fetcher = TMDBFetcher()
-recommender = HybridRecommender(db_manager)
-visualizer = BrainVisualizer()
+@api.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.profile = profiler.start()
 
-@app.route('/')
+@api.after_app_request
+def record_request_metrics(response):
+    elapsed = time.perf_counter() - g.request_started
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    REGISTRY.observe('http_request_duration_seconds', elapsed, (('route', route), ('method', request.method)))
+    REGISTRY.inc('http_requests_total', labels=(('route', route), ('method', request.method),
+                                                ('status', str(response.status_code))))
+    return response
+
+@api.teardown_app_request
+def stop_request_profile(exc):
+    # Teardown runs even when a handler raises, so the profiler is always
+    # released.
+    profile = g.pop('profile', None)
+    if profile is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        profiler.stop(profile, route, time.perf_counter() - g.request_started)
+
+@api.route('/')
 def index():
     return send_from_directory('.', 'index.html')
 
-@app.route('/<path:path>')
+@api.route('/<path:path>')
 def static_files(path):
     return send_from_directory('.', path)
 
-@app.route('/api/init', methods=['GET'])
+@api.route('/api/init', methods=['GET'])
 def initialize():
     try:
         movies = fetcher.fetch_popular_movies(pages=3)
+        ingestion = fetcher.ingestion_stats()
         fetcher.save_movies_to_db(movies)
         
-        conn = sqlite3.connect(Config.DATABASE_PATH)
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM ratings")
-        count = cursor.fetchone()[0]
-        conn.close()
+        if db_manager.count_ratings() == 0:
+            fetcher.generate_synthetic_ratings(num_users=50, ratings_per_user=15, seed=current_app.config['SYNTHETIC_SEED'])
         
-        if count == 0:
-            fetcher.generate_synthetic_ratings(num_users=50, ratings_per_user=15)
+        recommender.load_data(force=True)
+        started = recommender.start_training('init')
         
-        recommender.load_data()
-        recommender.train_collaborative()
-        recommender.prepare_content_features()
-        
-        return jsonify({'status': 'success', 'message': 'System initialized'})
+        return jsonify({
+            'status': 'accepted',
+            'message': 'Data loaded; training started' if started else 'Data loaded; training already running',
+            'ingestion': ingestion,
+            'training': recommender.training_status()
+        }), 202
     except Exception as e:
+        record_exception(e)
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/movies/popular', methods=['GET'])
+@api.route('/api/train', methods=['POST'])
+def train():
+    started = recommender.start_training('manual')
+    return jsonify({'started': started, 'training': recommender.training_status()}), 202
+
+@api.route('/api/train/status', methods=['GET'])
+def train_status():
+    return jsonify(recommender.training_status())
+
+@api.route('/api/movies/popular', methods=['GET'])
 def get_popular_movies():
     try:
         page = request.args.get('page', 1, type=int)
         limit = request.args.get('limit', 20, type=int)
+        cursor = request.args.get('cursor')
         
-        conn = sqlite3.connect(Config.DATABASE_PATH)
-        df = conn.execute(
-            "SELECT * FROM movies ORDER BY popularity DESC LIMIT ? OFFSET ?",
-            (limit, (page-1)*limit)
-        ).fetchall()
-        conn.close()
+        if cursor:
+            try:
+                popularity, movie_id = cursor.rsplit(':', 1)
+                popularity, movie_id = float(popularity), int(movie_id)
+            except ValueError:
+                return jsonify({'error': 'cursor must be the next_cursor of a previous page'}), 400
+            df = db_manager.get_popular_movies_after(popularity, movie_id, limit)
+        else:
+            df = db_manager.get_popular_movies(limit, (page-1)*limit)
         
         movies = []
         for row in df:
@@ -74,60 +246,129 @@ def get_popular_movies():
                 'poster': f"https://image.tmdb.org/t/p/w500{row[7]}" if row[7] else None
             })
         
-        return jsonify({'movies': movies})
+        next_cursor = f"{df[-1][8]!r}:{df[-1][0]}" if len(df) == limit else None
+        return jsonify({'movies': movies, 'next_cursor': next_cursor})
     except Exception as e:
+        record_exception(e)
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/recommend/<int:user_id>', methods=['GET'])
+@api.route('/api/recommend/<int:user_id>', methods=['GET'])
 def get_recommendations(user_id):
     try:
         movie_id = request.args.get('movie_id', type=int)
         n = request.args.get('n', 10, type=int)
+        alpha = min(1.0, max(0.0, request.args.get('alpha', current_app.config['HYBRID_ALPHA'], type=float)))
+        genres = request.args.get('genres', '')
+        try:
+            genres = [int(g) for g in genres.split(',') if g.strip()]
+        except ValueError:
+            return jsonify({'error': 'genres must be comma-separated TMDB genre ids'}), 400
         
         recommender.load_data()
         
-        if movie_id:
-            recommendations = recommender.hybrid_recommend(user_id, movie_id, n)
-        else:
-            recommendations = recommender.get_collaborative_recommendations(user_id, n)
+        recommendations = recommender.recommend(user_id, movie_id, n, alpha, genres)
         
         result = []
         for _, movie in recommendations.iterrows():
-            result.append({
+            item = {
                 'id': int(movie['id']),
                 'title': movie['title'],
                 'rating': float(movie['vote_average'])
-            })
+            }
+            if 'score' in movie:
+                item['score'] = round(float(movie['score']), 4)
+            result.append(item)
         
         return jsonify({'recommendations': result})
+    except ModelNotReady as e:
+        return model_not_ready(e)
     except Exception as e:
+        record_exception(e)
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/brain/analyze/<int:movie_id>', methods=['GET'])
+@api.route('/api/brain/template', methods=['GET'])
+def brain_template():
+    template = visualizer.template()
+    if request.if_none_match.contains(template['version']):
+        return '', 304
+    response = current_app.response_class(template['json'], mimetype='application/json')
+    response.set_etag(template['version'])
+    response.cache_control.max_age = 86400
+    return response
+
+@api.route('/api/brain/analyze/<int:movie_id>', methods=['GET'])
 def analyze_brain(movie_id):
     try:
         user_id = request.args.get('user_id', 1, type=int)
+        delta = request.args.get('format') == 'delta'
         
-        brain_data = visualizer.create_brain_visualization(movie_id, user_id)
         activity = visualizer.generate_brain_activity(movie_id, user_id)
+        if delta:
+            brain_data = visualizer.create_brain_visualization_delta(movie_id, user_id, activity)
+        else:
+            brain_data = visualizer.create_brain_visualization(movie_id, user_id, activity)
         wave_type, mood = visualizer.analyze_brain_wave(activity)
         
-        return jsonify({
-            'visualization': json.loads(brain_data),
+        result = {
             'activity': activity,
             'wave_type': wave_type,
             'mood': mood
-        })
+        }
+        if delta:
+            return jsonify({'visualization_delta': brain_data, **result})
+        # The figure is already JSON text; splice it in rather than parsing
+        # it back into Python objects only for jsonify to re-encode them.
+        body = '{"visualization":' + brain_data + ',' + json.dumps(result)[1:]
+        return current_app.response_class(body, mimetype='application/json')
     except Exception as e:
+        record_exception(e)
         return jsonify({'error': str(e)}), 500
-     @app.route('/api/brain/recommend/<int:user_id>', methods=['GET'])
+
+@api.route('/api/brain/analyze/batch', methods=['POST'])
+def analyze_brain_batch():
+    try:
+        data = request.json or {}
+        user_id = data.get('user_id', 1)
+        movie_ids = data.get('movie_ids') or []
+        figures = data.get('figures')
+        
+        if not isinstance(movie_ids, list) or not all(isinstance(m, int) for m in movie_ids):
+            return jsonify({'error': 'movie_ids must be a list of integers'}), 400
+        batch_max = current_app.config['BRAIN_BATCH_MAX']
+        if len(movie_ids) > batch_max:
+            return jsonify({'error': f'at most {batch_max} movie_ids per request'}), 400
+        if figures not in (None, 'delta', 'full'):
+            return jsonify({'error': "figures must be 'delta' or 'full'"}), 400
+        
+        results = visualizer.analyze_batch(movie_ids, user_id)
+        if figures == 'delta':
+            for result in results:
+                result['visualization_delta'] = visualizer.create_brain_visualization_delta(
+                    result['movie_id'], user_id, result['activity']
+                )
+        elif figures == 'full':
+            # Same splicing as the single-movie route: figures stay JSON text.
+            items = [
+                json.dumps(result)[:-1] + ',"visualization":'
+                + visualizer.create_brain_visualization(result['movie_id'], user_id, result['activity']) + '}'
+                for result in results
+            ]
+            return current_app.response_class('{"results":[' + ','.join(items) + ']}', mimetype='application/json')
+        
+        return jsonify({'results': results})
+    except Exception as e:
+        record_exception(e)
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/brain/recommend/<int:user_id>', methods=['GET'])
 def get_brain_recommendations(user_id):
     try:
         wave_type = request.args.get('wave', 'alpha')
         n = request.args.get('n', 10, type=int)
+        trending = request.args.get('trending', 'false').lower() in ('1', 'true', 'yes')
         
         recommender.load_data()
-        recommendations = recommender.get_brain_wave_recommendations(user_id, wave_type, n)
+        recommendations = recommender.get_brain_wave_recommendations(user_id, wave_type, n, trending)
         
         result = []
         for _, movie in recommendations.iterrows():
@@ -137,24 +378,72 @@ def get_brain_recommendations(user_id):
                 'rating': float(movie['vote_average'])
             })
         
-        return jsonify({'recommendations': result, 'wave': wave_type})
+        return jsonify({'recommendations': result, 'wave': wave_type, 'trending': trending})
+    except ModelNotReady as e:
+        return model_not_ready(e)
     except Exception as e:
+        record_exception(e)
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/rate', methods=['POST'])
+@api.route('/api/rate', methods=['POST'])
 def rate_movie():
     try:
-        data = request.json
+        from wave_popularity import BRAIN_WAVES
+        
+        data = request.get_json(silent=True) or {}
         user_id = data.get('user_id')
         movie_id = data.get('movie_id')
         rating = data.get('rating')
         brain_wave = data.get('brain_wave', 'alpha')
         
+        # Validated before the insert: a stored NULL or non-numeric rating
+        # would poison every later snapshot load and retrain.
+        if not all(isinstance(v, int) and not isinstance(v, bool) for v in (user_id, movie_id)):
+            return jsonify({'error': 'user_id and movie_id must be integers'}), 400
+        if (not isinstance(rating, (int, float)) or isinstance(rating, bool) or not math.isfinite(rating)
+                or not 0.5 <= rating <= 5.0):
+            return jsonify({'error': 'rating must be a number from 0.5 to 5.0'}), 400
+        if brain_wave not in BRAIN_WAVES:
+            return jsonify({'error': f"brain_wave must be one of {', '.join(BRAIN_WAVES)}"}), 400
+        rating = float(rating)
+        
         db_manager.add_rating(user_id, movie_id, rating, brain_wave)
+        recommender.record_rating(user_id, movie_id, rating)
         
         return jsonify({'status': 'success'})
     except Exception as e:
+        record_exception(e)
         return jsonify({'error': str(e)}), 500
 
-if name == 'main':
+@api.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return current_app.response_class(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@api.route('/api/metrics/cache', methods=['GET'])
+def cache_metrics():
+    return jsonify({
+        'recommendations': recommender.cache_stats(),
+        'brain_activity': visualizer.cache_stats()
+    })
+
+@api.route('/api/metrics/snapshot', methods=['GET'])
+def snapshot_metrics():
+    return jsonify(recommender.snapshot_stats())
+
+def create_app(config=Config):
+    # Cheap: no database connection, model or figure is touched until a
+    # request needs it, or until config.PRELOAD_COMPONENTS asks for it.
+    app = Flask(__name__, static_url_path='', static_folder='.')
+    app.config.from_object(config)
+    CORS(app)
+    app.register_blueprint(api)
+    app.extensions['cinematic_brain'] = app_services = Services(config)
+    register_metrics(app_services)
+    for name in config.PRELOAD_COMPONENTS:
+        app_services.get(name)
+    return app
+
+app = create_app()
+
+if __name__ == '__main__':
     app.run(host=Config.HOST, port=Config.PORT, debug=Config.DEBUG) 
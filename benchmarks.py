@@ -0,0 +1,741 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Synthetic catalog sizes for the suite; all seeded offline, no TMDB calls.
+SCALES = {
+    'small': {'movies': 1000, 'users': 1000, 'ratings_per_user': 10},
+    'medium': {'movies': 10000, 'users': 10000, 'ratings_per_user': 100},
+    'large': {'movies': 100000, 'users': 100000, 'ratings_per_user': 100},
+}
+# Fixed "now" for generated rating timestamps, so trending scores repeat too.
+SEED_EPOCH = 1767225600
+
+
+def synthetic_overviews(n_movies, vocab_size=5000, words_per_movie=40, seed=42):
+    rng = np.random.default_rng(seed)
+    vocab = np.array([f'w{i}' for i in range(vocab_size)])
+    # Zipf-like word frequencies so the TF-IDF matrix looks like real text.
+    weights = 1.0 / np.arange(1, vocab_size + 1)
+    weights /= weights.sum()
+    words = rng.choice(vocab, size=(n_movies, words_per_movie), p=weights)
+    return [' '.join(row) for row in words]
+
+
+def measure(fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def peak_rss_bytes():
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def percentiles(samples):
+    samples = np.asarray(samples) * 1000
+    return {
+        'p50_ms': round(float(np.percentile(samples, 50)), 4),
+        'p99_ms': round(float(np.percentile(samples, 99)), 4),
+    }
+
+
+def bench_content_similarity(n_movies=5000, k=50, lookups=200, n=10, block_size=256, seed=42):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.metrics.pairwise import cosine_similarity
+    from similarity_index import SimilarityIndex
+
+    tfidf_matrix = TfidfVectorizer().fit_transform(synthetic_overviews(n_movies, seed=seed))
+    queries = np.random.default_rng(seed).integers(0, n_movies, lookups)
+
+    dense, dense_build, dense_peak = measure(lambda: cosine_similarity(tfidf_matrix, tfidf_matrix))
+    dense_latency = []
+    for idx in queries:
+        started = time.perf_counter()
+        sim_scores = sorted(enumerate(dense[idx]), key=lambda x: x[1], reverse=True)[1:n + 1]
+        [i[0] for i in sim_scores]
+        dense_latency.append(time.perf_counter() - started)
+    dense_bytes = dense.nbytes
+    del dense
+
+    index, index_build, index_peak = measure(
+        lambda: SimilarityIndex.build(tfidf_matrix, k=k, block_size=block_size)
+    )
+    index_latency = []
+    for idx in queries:
+        started = time.perf_counter()
+        index.lookup(idx, n)
+        index_latency.append(time.perf_counter() - started)
+
+    return {
+        'movies': n_movies,
+        'k': k,
+        'dense': {
+            'build_s': round(dense_build, 4),
+            'bytes': dense_bytes,
+            'peak_bytes': dense_peak,
+            **percentiles(dense_latency),
+        },
+        'index': {
+            'build_s': round(index_build, 4),
+            'bytes': index.nbytes,
+            'peak_bytes': index_peak,
+            **percentiles(index_latency),
+        },
+    }
+
+
+def synthetic_scorer(n_users, n_items, n_factors=100, n_topics=50, seed=42):
+    from svd_scorer import SVDScorer
+
+    # Real SVD item factors are clustered by taste; mimic that so the ANN
+    # numbers are not measured on structureless Gaussian noise.
+    rng = np.random.default_rng(seed)
+    topics = rng.normal(0, 0.05, (n_topics, n_factors))
+    qi = topics[rng.integers(0, n_topics, n_items)] + rng.normal(0, 0.02, (n_items, n_factors))
+    pu = topics[rng.integers(0, n_topics, n_users)] + rng.normal(0, 0.02, (n_users, n_factors))
+    bu = rng.normal(0, 0.2, n_users)
+    bi = rng.normal(0, 0.2, n_items)
+    scorer = SVDScorer(pu, qi, bu, bi, 3.0, range(n_users), range(n_items))
+    return scorer, np.arange(n_items)
+
+
+def bench_ann(n_items=50000, n_users=200, n=10, n_candidates=200, n_lists=None, probes=(1, 4, 8, 16, 32), seed=42):
+    from ann_index import IVFIndex, query_vector, recall_at_n
+
+    scorer, movie_ids = synthetic_scorer(n_users, n_items, seed=seed)
+    user_ids = list(range(n_users))
+    index, build_s, _ = measure(lambda: IVFIndex.from_scorer(scorer, movie_ids, n_lists=n_lists))
+
+    exact_latency = []
+    for user_id in user_ids:
+        started = time.perf_counter()
+        scorer.top_n(user_id, movie_ids, n=n)
+        exact_latency.append(time.perf_counter() - started)
+
+    results = []
+    for n_probe in probes:
+        latency = []
+        for user_id in user_ids:
+            started = time.perf_counter()
+            candidates = index.search(query_vector(scorer, user_id), n_candidates, n_probe)
+            scorer.top_n(user_id, movie_ids, n=n, candidates=candidates)
+            latency.append(time.perf_counter() - started)
+        results.append({
+            'n_probe': n_probe,
+            'recall_at_n': round(recall_at_n(scorer, index, movie_ids, user_ids, n, n_candidates, n_probe), 4),
+            **percentiles(latency),
+        })
+
+    return {
+        'items': n_items,
+        'n': n,
+        'n_lists': index.n_lists,
+        'n_candidates': n_candidates,
+        'build_s': round(build_s, 4),
+        'exact': percentiles(exact_latency),
+        'ann': results,
+    }
+
+
+def bench_brain(requests=200, seed=42):
+    from plotly.utils import PlotlyJSONEncoder
+    from brain_visualizer import BrainVisualizer
+
+    visualizer = BrainVisualizer()
+    rng = np.random.default_rng(seed)
+    movie_ids = rng.integers(1, 10000, requests).tolist()
+    _, template_build_s, _ = measure(visualizer.template)
+
+    def run(render):
+        latency, sizes = [], []
+        for movie_id in movie_ids:
+            started = time.perf_counter()
+            body = render(movie_id)
+            latency.append(time.perf_counter() - started)
+            sizes.append(len(body))
+        return {**percentiles(latency), 'payload_bytes': int(np.median(sizes))}
+
+    def rebuild(movie_id):
+        activity = visualizer.generate_brain_activity(movie_id)
+        return json.dumps(visualizer.build_figure(activity), cls=PlotlyJSONEncoder)
+
+    return {
+        'requests': requests,
+        'template_build_s': round(template_build_s, 4),
+        'template_bytes': len(visualizer.template()['json']),
+        'rebuild': run(rebuild),
+        'template': run(visualizer.create_brain_visualization),
+        'delta': run(lambda movie_id: json.dumps(visualizer.create_brain_visualization_delta(movie_id))),
+    }
+
+
+def bench_loader(db_path='movies.db', lookups=200, seed=42):
+    from columnar import GenreTokens, RatingStore, catalog_rows
+    from database import DatabaseManager
+
+    db = DatabaseManager(db_path)
+    db.migrate()
+    movies_df = db.get_all_movies()
+    catalog_ids = movies_df['id'].to_numpy()
+
+    def load_frames():
+        # The load before the columnar store: int64/object frames, genres
+        # re-joined from JSON, and per-user lookups by full-column scan.
+        ratings_df = db.get_ratings_since(0).drop(columns='row_id')
+        genres = movies_df['genres'].apply(lambda x: ' '.join([str(g) for g in json.loads(x)]) if x else '')
+        return ratings_df, genres
+
+    def load_store():
+        store, _ = RatingStore.load(db, catalog_ids)
+        pairs = db.get_movie_genres()
+        genres = GenreTokens.from_pairs(catalog_rows(pairs['movie_id'].to_numpy(), catalog_ids),
+                                        pairs['genre_id'].to_numpy(), len(movies_df))
+        return store, genres
+
+    (frames, frame_genres), frames_s, frames_peak = measure(load_frames)
+    if frames.empty:
+        db.close_all()
+        return {'ratings': 0}
+    user_ids = np.random.default_rng(seed).choice(frames['user_id'].unique(), lookups).tolist()
+    frames_latency = []
+    for user_id in user_ids:
+        started = time.perf_counter()
+        frames.loc[frames['user_id'] == user_id, 'movie_id'].to_numpy()
+        frames_latency.append(time.perf_counter() - started)
+    frames_bytes = int(frames.memory_usage(deep=True).sum() + frame_genres.memory_usage(deep=True))
+    n_ratings = len(frames)
+    del frames, frame_genres
+
+    (store, genres), store_s, store_peak = measure(load_store)
+    _, index_s, index_peak = measure(store.ensure_indexes)
+    store_latency = []
+    for user_id in user_ids:
+        started = time.perf_counter()
+        store.user_movies(user_id)
+        store_latency.append(time.perf_counter() - started)
+    db.close_all()
+
+    return {
+        'ratings': n_ratings,
+        'movies': len(movies_df),
+        'frames': {
+            'load_s': round(frames_s, 4),
+            'bytes': frames_bytes,
+            'peak_bytes': frames_peak,
+            **percentiles(frames_latency),
+        },
+        'columnar': {
+            'load_s': round(store_s, 4),
+            'index_build_s': round(index_s, 4),
+            'bytes': store.nbytes + genres.nbytes,
+            'index_bytes': store.index_nbytes,
+            'peak_bytes': max(store_peak, index_peak),
+            **percentiles(store_latency),
+        },
+    }
+
+
+def seed_database(db_path, movies, users, ratings_per_user, seed=42):
+    from bulk_loader import bulk_insert_ratings, generate_movies, generate_ratings
+    from data_fetcher import TMDBFetcher
+    from database import DatabaseManager
+
+    db = DatabaseManager(db_path)
+    TMDBFetcher(db).save_movies_to_db(generate_movies(movies, seed))
+    inserted = bulk_insert_ratings(
+        db, generate_ratings(db.get_movie_ids(), users, ratings_per_user, seed, now=SEED_EPOCH)
+    )
+    db.close_all()
+    return inserted
+
+
+def latency_report(latency):
+    return {
+        'requests': len(latency),
+        'throughput_per_s': round(len(latency) / sum(latency), 2) if sum(latency) > 0 else None,
+        **percentiles(latency),
+    }
+
+
+def bench_micro(db_path, model_dir=None, requests=200, seed=42):
+    # Calls the recommender and visualizer directly, bypassing the result
+    # caches, so each case measures one uncached computation. One untimed
+    # call per case keeps lazy first-use builds out of the percentiles; boot
+    # and the content index build are reported separately.
+    from brain_visualizer import BrainVisualizer
+    from database import DatabaseManager
+    from model_store import ModelStore
+    from recommender import HybridRecommender
+    from wave_popularity import BRAIN_WAVES
+
+    db = DatabaseManager(db_path)
+    recommender = HybridRecommender(db, model_store=ModelStore(model_dir) if model_dir else None,
+                                    warm_users=0, training_mode='thread')
+    started = time.perf_counter()
+    boot = recommender.boot()
+    recommender.wait_for_training()
+    startup_s = time.perf_counter() - started
+    visualizer = BrainVisualizer(recommender)
+
+    snapshot = recommender.snapshot
+    rng = np.random.default_rng(seed)
+    user_ids = rng.choice(np.unique(snapshot.ratings.user_ids), requests).tolist()
+    movie_ids = rng.choice(snapshot.movie_ids, requests).tolist()
+    waves = rng.choice(BRAIN_WAVES, requests).tolist()
+
+    started = time.perf_counter()
+    recommender.prepare_content_features()
+    content_build_s = time.perf_counter() - started
+
+    cases = {
+        'collaborative': lambda i: recommender.get_collaborative_recommendations(user_ids[i]),
+        'content': lambda i: recommender.get_content_recommendations(movie_ids[i]),
+        'hybrid': lambda i: recommender.hybrid_recommend(user_ids[i], movie_ids[i]),
+        'brain_wave': lambda i: recommender.get_brain_wave_recommendations(user_ids[i], waves[i]),
+        'brain_visualization': lambda i: visualizer.create_brain_visualization(movie_ids[i], user_ids[i]),
+    }
+    results = {}
+    for name, call in cases.items():
+        call(0)
+        latency = []
+        for i in range(requests):
+            started = time.perf_counter()
+            call(i)
+            latency.append(time.perf_counter() - started)
+        results[name] = latency_report(latency)
+    db.close_all()
+
+    return {
+        'movies': len(snapshot.movie_ids),
+        'ratings': len(snapshot.ratings),
+        'boot': boot,
+        'startup_s': round(startup_s, 3),
+        'content_build_s': round(content_build_s, 3),
+        'cases': results,
+        'peak_rss_bytes': peak_rss_bytes(),
+    }
+
+
+ENDPOINTS = {
+    'recommend': '/api/recommend/{user_id}?n=10',
+    'recommend_hybrid': '/api/recommend/{user_id}?n=10&movie_id={movie_id}',
+    'brain_analyze': '/api/brain/analyze/{movie_id}?user_id={user_id}',
+    'brain_analyze_delta': '/api/brain/analyze/{movie_id}?user_id={user_id}&format=delta',
+    'brain_recommend': '/api/brain/recommend/{user_id}?wave={wave}',
+    'movies_popular': '/api/movies/popular?page={page}',
+}
+
+
+def bench_endpoints(db_path, model_dir, requests=600, concurrency=8, seed=42):
+    # Drives the Flask app through its test client from several threads.
+    # Requests cycle through ENDPOINTS with random users and movies, so the
+    # result caches see a realistic mix of hits and misses.
+    from app import create_app
+    from config import Config
+    from wave_popularity import BRAIN_WAVES
+
+    class BenchConfig(Config):
+        DATABASE_PATH = db_path
+        MODEL_DIR = model_dir
+        TRAINING_MODE = 'thread'
+        CACHE_WARM_USERS = 0
+        PRELOAD_COMPONENTS = ['recommender', 'visualizer']
+
+    started = time.perf_counter()
+    app = create_app(BenchConfig)
+    startup_s = time.perf_counter() - started
+    recommender = app.extensions['cinematic_brain'].get('recommender')
+    recommender.wait_for_training()
+
+    snapshot = recommender.snapshot
+    rng = np.random.default_rng(seed)
+    users = rng.choice(np.unique(snapshot.ratings.user_ids), requests).tolist()
+    movies = rng.choice(snapshot.movie_ids, requests).tolist()
+    waves = rng.choice(BRAIN_WAVES, requests).tolist()
+    pages = rng.integers(1, 6, requests).tolist()
+    names = list(ENDPOINTS)
+    plan = [
+        (names[i % len(names)], ENDPOINTS[names[i % len(names)]].format(
+            user_id=users[i], movie_id=movies[i], wave=waves[i], page=pages[i]))
+        for i in range(requests)
+    ]
+
+    def run(chunk):
+        client = app.test_client()
+        samples = []
+        for name, url in chunk:
+            started = time.perf_counter()
+            response = client.get(url)
+            response.get_data()
+            samples.append((name, time.perf_counter() - started, response.status_code))
+        return samples
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        chunks = pool.map(run, [plan[i::concurrency] for i in range(concurrency)])
+        samples = [sample for chunk in chunks for sample in chunk]
+    wall_s = time.perf_counter() - started
+
+    endpoints = {}
+    for name in names:
+        latency = [seconds for endpoint, seconds, _ in samples if endpoint == name]
+        errors = sum(1 for endpoint, _, status in samples if endpoint == name and status >= 400)
+        endpoints[name] = {'requests': len(latency), 'errors': errors, **percentiles(latency)}
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'startup_s': round(startup_s, 3),
+        'wall_s': round(wall_s, 3),
+        'throughput_per_s': round(requests / wall_s, 2),
+        'errors': sum(e['errors'] for e in endpoints.values()),
+        **percentiles([seconds for _, seconds, _ in samples]),
+        'endpoints': endpoints,
+        'cache': recommender.cache_stats(),
+        'peak_rss_bytes': peak_rss_bytes(),
+    }
+
+
+STARTUP_SCRIPT = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+phases = {{}}
+sys.stderr.write('phase: interpreter' + chr(10))
+
+def phase(name, started):
+    phases[name] = round(time.perf_counter() - started, 4)
+    sys.stderr.write('phase: ' + name + chr(10))
+    sys.stderr.flush()
+
+started = time.perf_counter()
+import app
+phase('import_app', started)
+
+class StartupConfig(app.Config):
+    DATABASE_PATH = {db_path!r}
+    MODEL_DIR = {model_dir!r}
+    TRAINING_MODE = 'thread'
+    CACHE_WARM_USERS = 0
+
+started = time.perf_counter()
+client = app.create_app(StartupConfig).test_client()
+phase('create_app', started)
+for name, url in {requests!r}:
+    started = time.perf_counter()
+    status = client.get(url).status_code
+    phase(name, started)
+    phases[name + '_status'] = status
+print(json.dumps(phases))
+"""
+
+STARTUP_REQUESTS = [
+    ('first_popular', '/api/movies/popular'),
+    ('first_recommend', '/api/recommend/1?n=10'),
+    ('first_brain_analyze', '/api/brain/analyze/{movie_id}?user_id=1'),
+]
+
+
+def parse_importtime(stderr):
+    # -X importtime writes "import time: self [us] | cumulative | package" to
+    # stderr, nested imports indented by two spaces per level; the startup
+    # script adds "phase: name" after each phase, so every import is charged
+    # to the phase that triggered it. Returns {phase: [(module, depth,
+    # cumulative_us)]}.
+    phases, imports = {}, []
+    for line in stderr.splitlines():
+        if line.startswith('phase: '):
+            phases[line[len('phase: '):]] = imports
+            imports = []
+        elif line.startswith('import time:') and 'self [us]' not in line:
+            _, cumulative_us, module = line[len('import time:'):].split('|')
+            depth = (len(module) - len(module.lstrip()) - 1) // 2
+            imports.append((module.strip(), depth, int(cumulative_us)))
+    return phases
+
+
+def bench_startup(db_path, model_dir, top=15):
+    # Cold start of a fresh worker: importing app, create_app(), then the
+    # first request to each route family, with the imports each one pulls in.
+    from database import DatabaseManager
+
+    db = DatabaseManager(db_path)
+    movie_id = db.get_movie_ids()[0]
+    db.close_all()
+    requests = [(name, url.format(movie_id=movie_id)) for name, url in STARTUP_REQUESTS]
+    script = STARTUP_SCRIPT.format(root=os.path.dirname(os.path.abspath(__file__)), db_path=db_path,
+                                   model_dir=model_dir, requests=requests)
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', script], capture_output=True, text=True,
+                               check=True)
+    timings = json.loads(completed.stdout.strip().splitlines()[-1])
+    imports = parse_importtime(completed.stderr)
+
+    phases = {}
+    for name, modules in imports.items():
+        if name == 'interpreter':
+            continue
+        # Cumulative times nest (flask includes werkzeug), so only top-level
+        # imports add up to import_s; modules lists the slowest at any depth.
+        slowest = sorted(modules, key=lambda module: -module[2])[:top]
+        phases[name] = {
+            'seconds': timings[name],
+            'status': timings.get(name + '_status'),
+            'import_s': round(sum(us for _, depth, us in modules if depth == 0) / 1e6, 4),
+            'modules': {module: round(us / 1e6, 4) for module, _, us in slowest},
+        }
+    return {'phases': phases}
+
+
+def environment(seed):
+    import pandas
+    import sklearn
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pandas.__version__,
+        'sklearn': sklearn.__version__,
+        'seed': seed,
+    }
+
+
+def run_child(command, args):
+    # Each phase runs in a fresh interpreter so its peak RSS is its own.
+    fd, path = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    try:
+        subprocess.run([sys.executable, os.path.abspath(__file__), command, *args, '--output', path], check=True)
+        with open(path) as f:
+            return json.load(f)
+    finally:
+        os.remove(path)
+
+
+def run_suite(scales, workdir='bench_data', requests=200, endpoint_requests=600, concurrency=8, seed=42):
+    # Seeded databases and trained models are kept in workdir and reused by
+    # later runs at the same scale and seed, so only the first run pays for
+    # seeding and training.
+    os.makedirs(workdir, exist_ok=True)
+    report = {'environment': environment(seed), 'scales': {}}
+    for scale in scales:
+        config = SCALES[scale]
+        db_path = os.path.join(workdir, f'{scale}-{seed}.db')
+        model_dir = os.path.join(workdir, f'{scale}-{seed}-models')
+        seed_s = None
+        if not os.path.exists(db_path):
+            started = time.perf_counter()
+            seed_database(db_path + '.tmp', config['movies'], config['users'], config['ratings_per_user'], seed)
+            os.replace(db_path + '.tmp', db_path)
+            seed_s = round(time.perf_counter() - started, 3)
+        common = ['--db', db_path, '--model-dir', model_dir, '--seed', str(seed)]
+        report['scales'][scale] = {
+            **config,
+            'ratings': config['users'] * min(config['ratings_per_user'], config['movies']),
+            'seed_s': seed_s,
+            'micro': run_child('micro', common + ['--requests', str(requests)]),
+            'endpoints': run_child('endpoints', common + ['--requests', str(endpoint_requests),
+                                                          '--concurrency', str(concurrency)]),
+            'startup': bench_startup(db_path, model_dir),
+        }
+    return report
+
+
+def latency_cases(report):
+    # (scale, section, case) -> stats for every comparable entry in a report.
+    cases = {}
+    for scale, result in report.get('scales', {}).items():
+        for case, stats in result['micro']['cases'].items():
+            cases[(scale, 'micro', case)] = stats
+        for case, stats in result['endpoints']['endpoints'].items():
+            cases[(scale, 'endpoints', case)] = stats
+        cases[(scale, 'endpoints', 'all')] = result['endpoints']
+        for phase, stats in result.get('startup', {}).get('phases', {}).items():
+            cases[(scale, 'startup', phase)] = stats
+    return cases
+
+
+def compare_reports(baseline, current, tolerance=0.1):
+    base_cases, current_cases = latency_cases(baseline), latency_cases(current)
+    rows, regressions = [], []
+    for key in sorted(base_cases.keys() & current_cases.keys()):
+        before, after = base_cases[key], current_cases[key]
+        row = {'case': '/'.join(key)}
+        for metric, higher_is_worse in (('p50_ms', True), ('p99_ms', True), ('throughput_per_s', False),
+                                        ('seconds', True)):
+            if not before.get(metric) or after.get(metric) is None:
+                continue
+            ratio = after[metric] / before[metric]
+            row[metric] = {'baseline': before[metric], 'current': after[metric], 'ratio': round(ratio, 3)}
+            if ratio > 1 + tolerance if higher_is_worse else ratio < 1 - tolerance:
+                regressions.append(f"{row['case']} {metric} {before[metric]} -> {after[metric]}")
+        rows.append(row)
+    return {'tolerance': tolerance, 'regressions': regressions, 'cases': rows}
+
+
+# name -> (sql, params, the index its plan must use)
+HOT_QUERIES = {
+    'user_ratings': ("SELECT * FROM ratings WHERE user_id = ?", (1,), 'idx_ratings_user_movie'),
+    'duplicate_rating': (
+        "SELECT 1 FROM ratings WHERE user_id = ? AND movie_id = ?", (1, 1), 'idx_ratings_user_movie'
+    ),
+    'wave_popularity': (
+        "SELECT movie_id, COUNT(*) FROM ratings WHERE brain_wave_type = ? AND rating >= ? GROUP BY movie_id",
+        ('alpha', 4.0),
+        'idx_ratings_wave',
+    ),
+    'popular_offset': (
+        "SELECT * FROM movies ORDER BY popularity DESC, id DESC LIMIT ? OFFSET ?", (20, 0), 'idx_movies_popularity'
+    ),
+    'popular_keyset': (
+        "SELECT * FROM movies WHERE (popularity, id) < (?, ?) ORDER BY popularity DESC, id DESC LIMIT ?",
+        (100.0, 1, 20),
+        'idx_movies_popularity',
+    ),
+}
+
+
+def uses_index(plan, index):
+    return any(f'INDEX {index}' in step for step in plan)
+
+
+def check_query_plans(db_path):
+    from database import DatabaseManager
+
+    db = DatabaseManager(db_path)
+    db.migrate()
+    report = {}
+    for name, (sql, params, index) in HOT_QUERIES.items():
+        plan = db.explain_query_plan(sql, params)
+        report[name] = {
+            'plan': plan,
+            'index': index,
+            'uses_index': uses_index(plan, index),
+            'full_scan': any(step.startswith('SCAN') and 'INDEX' not in step for step in plan),
+        }
+    db.close_all()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cinematic Brain benchmarks')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    content = sub.add_parser('content', help='dense cosine matrix vs top-K similarity index')
+    content.add_argument('--movies', type=int, default=5000)
+    content.add_argument('--k', type=int, default=50)
+    content.add_argument('--lookups', type=int, default=200)
+    content.add_argument('--block-size', type=int, default=256)
+
+    ann = sub.add_parser('ann', help='IVF retrieval recall@n and latency vs exact SVD scoring')
+    ann.add_argument('--items', type=int, default=50000)
+    ann.add_argument('--users', type=int, default=200)
+    ann.add_argument('--n', type=int, default=10)
+    ann.add_argument('--candidates', type=int, default=200)
+    ann.add_argument('--lists', type=int, default=None)
+    ann.add_argument('--probes', type=int, nargs='+', default=[1, 4, 8, 16, 32])
+
+    brain = sub.add_parser('brain', help='per-request figure rebuild vs pre-serialized template and delta')
+    brain.add_argument('--requests', type=int, default=200)
+
+    loader = sub.add_parser('loader', help='pandas frames vs the columnar rating store: load, memory, per-user lookup')
+    loader.add_argument('--db', default='movies.db')
+    loader.add_argument('--lookups', type=int, default=200)
+
+    plans = sub.add_parser('plans', help='EXPLAIN QUERY PLAN for the hot SQLite queries; exits 1 if one misses its index')
+    plans.add_argument('--db', default='movies.db')
+
+    micro = sub.add_parser('micro', help='per-call latency of the recommender and visualizer on one database')
+    micro.add_argument('--db', required=True)
+    micro.add_argument('--model-dir', default=None)
+    micro.add_argument('--requests', type=int, default=200)
+    micro.add_argument('--seed', type=int, default=42)
+
+    endpoints = sub.add_parser('endpoints', help='concurrent load on the Flask endpoints through the test client')
+    endpoints.add_argument('--db', required=True)
+    endpoints.add_argument('--model-dir', required=True)
+    endpoints.add_argument('--requests', type=int, default=600)
+    endpoints.add_argument('--concurrency', type=int, default=8)
+    endpoints.add_argument('--seed', type=int, default=42)
+
+    startup = sub.add_parser('startup', help='cold start of a fresh worker: import, create_app, first requests')
+    startup.add_argument('--db', required=True)
+    startup.add_argument('--model-dir', required=True)
+    startup.add_argument('--top', type=int, default=15, help='slowest top-level imports listed per phase')
+
+    suite = sub.add_parser('suite', help='seed synthetic scales, then run micro and endpoints on each')
+    suite.add_argument('--scales', nargs='+', choices=list(SCALES), default=['small', 'medium'])
+    suite.add_argument('--workdir', default='bench_data', help='seeded databases and models are cached here')
+    suite.add_argument('--requests', type=int, default=200)
+    suite.add_argument('--endpoint-requests', type=int, default=600)
+    suite.add_argument('--concurrency', type=int, default=8)
+    suite.add_argument('--seed', type=int, default=42)
+
+    compare = sub.add_parser('compare', help='flag latency and throughput regressions between two suite reports')
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+    compare.add_argument('--tolerance', type=float, default=0.1)
+
+    for command in sub.choices.values():
+        command.add_argument('--output', default=None, help='write the JSON result here instead of stdout')
+
+    args = parser.parse_args()
+    if args.command == 'content':
+        result = bench_content_similarity(args.movies, args.k, args.lookups, block_size=args.block_size)
+    elif args.command == 'ann':
+        result = bench_ann(args.items, args.users, args.n, args.candidates, args.lists, args.probes)
+    elif args.command == 'brain':
+        result = bench_brain(args.requests)
+    elif args.command == 'loader':
+        result = bench_loader(args.db, args.lookups)
+    elif args.command == 'plans':
+        result = check_query_plans(args.db)
+    elif args.command == 'micro':
+        result = bench_micro(args.db, args.model_dir, args.requests, args.seed)
+    elif args.command == 'endpoints':
+        result = bench_endpoints(args.db, args.model_dir, args.requests, args.concurrency, args.seed)
+    elif args.command == 'startup':
+        result = bench_startup(args.db, args.model_dir, args.top)
+    elif args.command == 'suite':
+        result = run_suite(args.scales, args.workdir, args.requests, args.endpoint_requests, args.concurrency,
+                           args.seed)
+    elif args.command == 'compare':
+        with open(args.baseline) as f, open(args.current) as g:
+            result = compare_reports(json.load(f), json.load(g), args.tolerance)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    else:
+        print(json.dumps(result, indent=2))
+    if args.command == 'compare' and result['regressions']:
+        sys.exit(1)
+    if args.command == 'plans' and not all(query['uses_index'] for query in result.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,70 @@
 import numpy as np
 import plotly.graph_objects as go
 from plotly.utils import PlotlyJSONEncoder
+import hashlib
 import json
-import random
+
+from cache import LRUCache
+from metrics import stage
+
+REGION_COORDS = [
+    (5, 5, 5), (-5, 5, 5), (5, -5, 5),
+    (-5, -5, 5), (5, 5, -5), (-5, 5, -5)
+]
+
+_PULSE_T = np.linspace(0, 2*np.pi, 20)
+PULSE_OFFSETS = np.array([np.sin(_PULSE_T) * 2, np.cos(_PULSE_T) * 2, np.sin(_PULSE_T * 2)])
+
+# How strongly each TMDB genre drives each region, in brain_regions order:
+# prefrontal, motor, sensory, visual, auditory, limbic.
+GENRE_REGIONS = {
+    28: [0.0, 1.0, 0.6, 0.6, 0.3, 0.2],     # Action
+    12: [0.2, 0.8, 0.4, 0.8, 0.2, 0.3],     # Adventure
+    16: [0.1, 0.2, 0.3, 1.0, 0.4, 0.4],     # Animation
+    35: [0.3, 0.1, 0.2, 0.2, 0.4, 0.8],     # Comedy
+    80: [0.8, 0.3, 0.4, 0.2, 0.1, 0.4],     # Crime
+    99: [1.0, 0.0, 0.2, 0.4, 0.2, 0.1],     # Documentary
+    18: [0.5, 0.0, 0.2, 0.1, 0.2, 1.0],     # Drama
+    10751: [0.1, 0.2, 0.2, 0.4, 0.3, 0.8],  # Family
+    14: [0.3, 0.3, 0.4, 1.0, 0.3, 0.4],     # Fantasy
+    36: [0.9, 0.1, 0.1, 0.3, 0.1, 0.3],     # History
+    27: [0.1, 0.4, 1.0, 0.3, 0.6, 0.8],     # Horror
+    10402: [0.1, 0.2, 0.3, 0.2, 1.0, 0.6],  # Music
+    9648: [1.0, 0.0, 0.4, 0.2, 0.2, 0.3],   # Mystery
+    10749: [0.1, 0.0, 0.3, 0.2, 0.3, 1.0],  # Romance
+    878: [0.8, 0.3, 0.3, 0.9, 0.3, 0.1],    # Science Fiction
+    10770: [0.2, 0.1, 0.2, 0.3, 0.3, 0.5],  # TV Movie
+    53: [0.6, 0.4, 0.9, 0.3, 0.4, 0.5],     # Thriller
+    10752: [0.5, 0.9, 0.6, 0.5, 0.5, 0.6],  # War
+    37: [0.2, 0.8, 0.3, 0.6, 0.3, 0.2],     # Western
+}
+REGION_WAVES = {
+    'prefrontal': ('alpha', 'You need a thought-provoking movie'),
+    'limbic': ('gamma', 'You want emotional experience'),
+    'visual': ('beta', 'You want visually stunning cinema'),
+    'auditory': ('delta', 'Music and sound matter to you'),
+}
+DEFAULT_WAVE = ('theta', 'You want something relaxing')
+GENRE_WEIGHT = 0.3
+HISTORY_WEIGHT = 0.15
+NOISE_AMPLITUDE = 0.1
+
+
+def hash_noise(movie_ids, user_id, n_regions):
+    # splitmix64 over (movie, user, region): uniform in [-1, 1), fixed for a
+    # given pair on every call and in every process, and cheap to vectorize.
+    movie_ids = np.asarray(movie_ids, dtype=np.int64).astype(np.uint64)
+    user = np.array([user_id or 0], dtype=np.int64).astype(np.uint64)
+    x = (movie_ids[:, None] * np.uint64(0x9E3779B97F4A7C15)
+         ^ user[:, None] * np.uint64(0xD1B54A32D192ED03)
+         ^ np.arange(1, n_regions + 1, dtype=np.uint64)[None, :] * np.uint64(0x94D049BB133111EB))
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    x = x ^ (x >> np.uint64(31))
+    return (x >> np.uint64(11)).astype(np.float64) / float(1 << 53) * 2 - 1
 
 class BrainVisualizer:
-    def init(self):
+    def __init__(self, recommender=None, cache_size=4096, cache_ttl=300):
         self.brain_regions = {
             'prefrontal': {'color': '#ff6b6b', 'activity': 0.5},
             'motor': {'color': '#4ecdc4', 'activity': 0.3},
@@ -14,31 +73,89 @@ class BrainVisualizer:
             'auditory': {'color': '#ffeaa7', 'activity': 0.2},
             'limbic': {'color': '#dfe6e9', 'activity': 0.6}
         }
+        self.recommender = recommender
+        self.region_names = list(self.brain_regions)
+        self.baseline = np.array([info['activity'] for info in self.brain_regions.values()])
+        # Keyed by (movie, user, movies version); the TTL bounds how long a
+        # user's rating history can lag behind in a cached result.
+        self.activity_cache = LRUCache(cache_size, cache_ttl)
+        self._genre_regions = (None, None)
+        self._template = None
         
-    def generate_brain_activity(self, movie_id, user_id=None):
-        activity = {}
-        for region in self.brain_regions:
-            base = self.brain_regions[region]['activity']
-            noise = random.uniform(-0.2, 0.2)
-            activity[region] = max(0, min(1, base + noise))
-        return activity
+    def movie_regions(self, snapshot):
+        # Per-movie region affinity (mean over the movie's genres), built once
+        # per movies table and shared by incremental snapshots.
+        genres, regions = self._genre_regions
+        if genres is snapshot.genres:
+            return regions
+        genres = snapshot.genres
+        table = np.zeros((len(genres.vocab), len(self.region_names)))
+        mapped = np.zeros(len(genres.vocab), dtype=bool)
+        for token, genre_id in enumerate(genres.vocab.tolist()):
+            if genre_id in GENRE_REGIONS:
+                table[token], mapped[token] = GENRE_REGIONS[genre_id], True
+        known = mapped[genres.tokens]
+        movie_rows = genres.token_rows()[known]
+        sums = np.zeros((len(genres), len(self.region_names)))
+        np.add.at(sums, movie_rows, table[genres.tokens[known]])
+        regions = sums / np.maximum(np.bincount(movie_rows, minlength=len(genres)), 1)[:, None]
+        self._genre_regions = (genres, regions)
+        return regions
+    
+    def user_profile(self, user_id, snapshot, regions):
+        # Regions of the movies a user rated, weighted by how far each rating
+        # sits from the middle of the scale: liked genres pull activity up.
+        if user_id is None:
+            return np.zeros(len(self.region_names))
+        rows = snapshot.ratings.rows_for_user(user_id)
+        movie_rows = snapshot.ratings.movie_rows[rows]
+        known = movie_rows >= 0
+        if not known.any():
+            return np.zeros(len(self.region_names))
+        weights = (snapshot.ratings.ratings[rows][known].astype(np.float64) - 2.75) / 2.25
+        rated = regions[movie_rows[known]]
+        return weights @ (rated - 0.4) / len(weights)
     
-    def create_brain_visualization(self, movie_id, user_id=None):
-        activity = self.generate_brain_activity(movie_id, user_id)
+    def activity_matrix(self, movie_ids, user_id=None):
+        # Activity for a whole candidate list in one pass; row i is movie_ids[i]
+        # with columns in region_names order.
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        activity = np.tile(self.baseline, (len(movie_ids), 1))
+        snapshot = self.recommender.snapshot if self.recommender is not None else None
+        if snapshot is not None and len(snapshot.movies_df):
+            regions = self.movie_regions(snapshot)
+            rows = np.array([snapshot.movie_index.get(m, -1) for m in movie_ids.tolist()], dtype=np.int64)
+            known = rows >= 0
+            activity[known] += GENRE_WEIGHT * (regions[rows[known]] - 0.4)
+            activity += HISTORY_WEIGHT * self.user_profile(user_id, snapshot, regions)
+        activity += NOISE_AMPLITUDE * hash_noise(movie_ids, user_id, len(self.region_names))
+        return np.clip(activity, 0, 1)
+    
+    def generate_brain_activity(self, movie_id, user_id=None):
+        snapshot = self.recommender.snapshot if self.recommender is not None else None
+        key = (movie_id, user_id, snapshot.version[0] if snapshot is not None else None)
         
+        def compute():
+            with stage('brain_activity'):
+                values = self.activity_matrix([movie_id], user_id)[0]
+            return {region: round(float(v), 4) for region, v in zip(self.region_names, values)}
+        
+        return dict(self.activity_cache.get_or_compute(key, compute))
+    
+    def cache_stats(self):
+        return self.activity_cache.stats()
+    
+    def build_figure(self, activity):
         theta = np.linspace(0, 2*np.pi, 100)
         phi = np.linspace(0, np.pi, 100)
         theta, phi = np.meshgrid(theta, phi)
         
         r = 10
-        x = r * np.sin(phi) * np.cos(theta)
-        y = r * np.sin(phi) * np.sin(theta)
-        z = r * np.cos(phi)
-        
-        activity_values = []
-        for region, value in activity.items():
-            region_size = value * 100
-            activity_values.append(region_size)
+        # Plotly ships numpy arrays as base64 typed arrays; float32 is ample
+        # for a display mesh and halves the largest part of the payload.
+        x = (r * np.sin(phi) * np.cos(theta)).astype(np.float32)
+        y = (r * np.sin(phi) * np.sin(theta)).astype(np.float32)
+        z = (r * np.cos(phi)).astype(np.float32)
         
         fig = go.Figure()
         
@@ -50,22 +167,15 @@ class BrainVisualizer:
             name='Brain Structure'
         ))
         
-        colors = [self.brain_regions[r]['color'] for r in activity.keys()]
-        
-        region_coords = [
-            (5, 5, 5), (-5, 5, 5), (5, -5, 5),
-            (-5, -5, 5), (5, 5, -5), (-5, 5, -5)
-        ]
-        
-        for i, (region, coord) in enumerate(zip(activity.keys(), region_coords)):
+        for region, coord in zip(activity.keys(), REGION_COORDS):
             value = activity[region]
-            size = 2 + value * 3
+            pulse_x, pulse_y, pulse_z = self.pulse_ring(coord, value)
             
             fig.add_trace(go.Scatter3d(
                 x=[coord[0]], y=[coord[1]], z=[coord[2]],
                 mode='markers',
                 marker=dict(
-                    size=size * 3,
+                    size=self.marker_size(value),
                     color=self.brain_regions[region]['color'],
                     opacity=0.8,
                     symbol='circle'
@@ -75,10 +185,6 @@ class BrainVisualizer:
                 hoverinfo='text'
             ))
             
-            pulse_x = [coord[0] + np.sin(t) * value * 2 for t in np.linspace(0, 2*np.pi, 20)]
-            pulse_y = [coord[1] + np.cos(t) * value * 2 for t in np.linspace(0, 2*np.pi, 20)]
-            pulse_z = [coord[2] + np.sin(t*2) * value for t in np.linspace(0, 2*np.pi, 20)]
-            
             fig.add_trace(go.Scatter3d(
                 x=pulse_x, y=pulse_y, z=pulse_z,
                 mode='lines',
@@ -102,7 +208,7 @@ class BrainVisualizer:
                 xaxis=dict(showticklabels=False, showgrid=False, zeroline=False, visible=False),
                 yaxis=dict(showticklabels=False, showgrid=False, zeroline=False, visible=False),
                 zaxis=dict(showticklabels=False, showgrid=False, zeroline=False, visible=False),
-             bgcolor='black'
+                bgcolor='black'
             ),
             paper_bgcolor='black',
             font={'color': 'white'},
@@ -115,19 +221,108 @@ class BrainVisualizer:
                 borderwidth=1
             )
         )
-        
-        return json.dumps(fig, cls=PlotlyJSONEncoder)
+        return fig
+    
+    @staticmethod
+    def marker_size(value):
+        return (2 + value * 3) * 3
+    
+    @staticmethod
+    def pulse_ring(coord, value):
+        ring = np.round(np.asarray(coord)[:, None] + PULSE_OFFSETS * value, 3)
+        return ring[0].tolist(), ring[1].tolist(), ring[2].tolist()
+    
+    def template(self):
+        # The mesh, layout and trace styling never change, so the figure is
+        # built and serialized once. The surface and layout are kept as JSON
+        # text; only the twelve small region traces are re-serialized per call.
+        if self._template is None:
+            baseline = {region: info['activity'] for region, info in self.brain_regions.items()}
+            with stage('plotly_serialization'):
+                figure_json = json.dumps(self.build_figure(baseline), cls=PlotlyJSONEncoder)
+            figure = json.loads(figure_json)
+            self._template = {
+                'version': hashlib.sha1(figure_json.encode()).hexdigest()[:12],
+                'json': figure_json,
+                'surface_json': json.dumps(figure['data'][0], separators=(',', ':')),
+                'layout_json': json.dumps(figure['layout'], separators=(',', ':')),
+                'markers': figure['data'][1::2],
+                'pulses': figure['data'][2::2],
+            }
+        return self._template
+    
+    def create_brain_visualization(self, movie_id, user_id=None, activity=None):
+        if activity is None:
+            activity = self.generate_brain_activity(movie_id, user_id)
+        with stage('plotly_serialization'):
+            template = self.template()
+            
+            traces = []
+            for i, region in enumerate(activity):
+                value = activity[region]
+                marker = template['markers'][i]
+                traces.append({
+                    **marker,
+                    'marker': {**marker['marker'], 'size': self.marker_size(value)},
+                    'text': f'{region}: {value:.2f}',
+                })
+                pulse_x, pulse_y, pulse_z = self.pulse_ring(REGION_COORDS[i], value)
+                traces.append({**template['pulses'][i], 'x': pulse_x, 'y': pulse_y, 'z': pulse_z})
+            
+            return (
+                '{"data":[' + template['surface_json'] + ',' + json.dumps(traces, separators=(',', ':'))[1:-1]
+                + '],"layout":' + template['layout_json'] + '}'
+            )
+    
+    def create_brain_visualization_delta(self, movie_id, user_id=None, activity=None):
+        # Plotly.restyle updates for a figure already rendered from
+        # template(): marker traces are 1, 3, ... 11, pulse rings 2, 4, ... 12.
+        if activity is None:
+            activity = self.generate_brain_activity(movie_id, user_id)
+        with stage('plotly_serialization'):
+            rings = [self.pulse_ring(REGION_COORDS[i], value) for i, value in enumerate(activity.values())]
+            return {
+                'template_version': self.template()['version'],
+                'markers': {
+                    'traces': list(range(1, 2 * len(activity), 2)),
+                    'update': {
+                        'marker.size': [self.marker_size(value) for value in activity.values()],
+                        'text': [f'{region}: {value:.2f}' for region, value in activity.items()],
+                    },
+                },
+                'pulses': {
+                    'traces': list(range(2, 2 * len(activity) + 1, 2)),
+                    'update': {
+                        'x': [ring[0] for ring in rings],
+                        'y': [ring[1] for ring in rings],
+                        'z': [ring[2] for ring in rings],
+                    },
+                },
+            }
     
     def analyze_brain_wave(self, activity_data):
         dominant_region = max(activity_data, key=activity_data.get)
-        
-        if dominant_region == 'prefrontal':
-            return 'alpha', 'You need a thought-provoking movie'
-        elif dominant_region == 'limbic':
-            return 'gamma', 'You want emotional experience'
-        elif dominant_region == 'visual':
-            return 'beta', 'You want visually stunning cinema'
-        elif dominant_region == 'auditory':
-            return 'delta', 'Music and sound matter to you'
-        else:
-            return 'theta', 'You want something relaxing' 
+        return REGION_WAVES.get(dominant_region, DEFAULT_WAVE)
+    
+    def analyze_brain_waves(self, activity):
+        # Vectorized analyze_brain_wave over a movies x regions matrix from
+        # activity_matrix(); argmax breaks ties the same way max() does.
+        waves = np.array([REGION_WAVES.get(region, DEFAULT_WAVE) for region in self.region_names], dtype=object)
+        dominant = np.argmax(activity, axis=1)
+        return waves[dominant, 0], waves[dominant, 1]
+    
+    def analyze_batch(self, movie_ids, user_id=None):
+        # Rounded like generate_brain_activity so a batch entry matches the
+        # single-movie endpoint exactly.
+        with stage('brain_activity'):
+            activity = np.round(self.activity_matrix(movie_ids, user_id), 4)
+        wave_types, moods = self.analyze_brain_waves(activity)
+        return [
+            {
+                'movie_id': int(movie_id),
+                'activity': dict(zip(self.region_names, values)),
+                'wave_type': wave_type,
+                'mood': mood,
+            }
+            for movie_id, values, wave_type, mood in zip(movie_ids, activity.tolist(), wave_types, moods)
+        ]
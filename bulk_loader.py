@@ -0,0 +1,152 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from database import DatabaseManager
+from migrations import RATINGS_INDEXES
+from wave_popularity import BRAIN_WAVES
+
+ONE_YEAR = 31536000
+
+
+def sample_distinct(rng, n_items, n_rows, k):
+    # k distinct item positions per row. For k well below n_items, draw with
+    # replacement and redraw the few collisions; otherwise rank random keys.
+    k = min(k, n_items)
+    if k * 4 > n_items:
+        return np.argsort(rng.random((n_rows, n_items)), axis=1)[:, :k]
+    picks = rng.integers(0, n_items, (n_rows, k))
+    while True:
+        picks.sort(axis=1)
+        duplicate = np.zeros_like(picks, dtype=bool)
+        duplicate[:, 1:] = picks[:, 1:] == picks[:, :-1]
+        if not duplicate.any():
+            return picks
+        picks[duplicate] = rng.integers(0, n_items, int(duplicate.sum()))
+
+
+def generate_ratings(movie_ids, num_users, ratings_per_user, seed=None, first_user_id=1, now=None,
+                     users_per_chunk=None):
+    # Yields column arrays chunk by chunk so tens of millions of rows never
+    # have to exist in memory at once. The same seed gives the same data.
+    movie_ids = np.asarray(movie_ids, dtype=np.int64)
+    rng = np.random.default_rng(seed)
+    now = int(time.time()) if now is None else int(now)
+    k = min(ratings_per_user, len(movie_ids))
+    if k == 0:
+        return
+    users_per_chunk = users_per_chunk or max(1, 1_000_000 // k)
+
+    for start in range(0, num_users, users_per_chunk):
+        users = min(users_per_chunk, num_users - start)
+        positions = sample_distinct(rng, len(movie_ids), users, k)
+        size = users * k
+        yield {
+            'user_id': np.repeat(np.arange(first_user_id + start, first_user_id + start + users), k),
+            'movie_id': movie_ids[positions.ravel()],
+            'rating': np.round(rng.uniform(0.5, 5.0, size) * 2) / 2,
+            'timestamp': now - rng.integers(0, ONE_YEAR + 1, size),
+            'brain_wave_type': rng.integers(0, len(BRAIN_WAVES), size).astype(np.uint8),
+        }
+
+
+def generate_movies(num_movies, seed=None, first_id=1):
+    rng = np.random.default_rng(seed)
+    genre_ids = [28, 12, 16, 35, 80, 99, 18, 10751, 14, 36, 27, 10402, 9648, 10749, 878, 53, 10752, 37]
+    words = ['space', 'war', 'hero', 'love', 'story', 'family', 'crime', 'city', 'dark', 'journey',
+             'music', 'secret', 'future', 'ghost', 'friend', 'island', 'king', 'road', 'storm', 'dream']
+    for i in range(num_movies):
+        yield {
+            'id': first_id + i,
+            'title': f'Synthetic Movie {first_id + i}',
+            'overview': ' '.join(rng.choice(words, 12)),
+            'release_date': f'{rng.integers(1970, 2026)}-01-01',
+            'vote_average': round(float(rng.uniform(1, 10)), 1),
+            'vote_count': int(rng.integers(0, 20000)),
+            'genre_ids': [int(g) for g in rng.choice(genre_ids, rng.integers(1, 4), replace=False)],
+            'poster_path': '',
+            'popularity': round(float(rng.pareto(1.5) * 10), 3),
+        }
+
+
+def bulk_insert_ratings(db, chunks, rebuild_indexes=True):
+    # Loads with synchronous=OFF and, optionally, without the ratings indexes,
+    # which are rebuilt once at the end; that is far cheaper than maintaining
+    # them row by row. Each chunk is its own transaction.
+    waves = np.array(BRAIN_WAVES, dtype=object)
+    inserted = 0
+    with db.get_connection() as conn:
+        conn.execute("PRAGMA synchronous=OFF")
+        try:
+            if rebuild_indexes:
+                for name in RATINGS_INDEXES:
+                    conn.execute(f"DROP INDEX IF EXISTS {name}")
+            for chunk in chunks:
+                rows = zip(
+                    chunk['user_id'].tolist(),
+                    chunk['movie_id'].tolist(),
+                    chunk['rating'].tolist(),
+                    chunk['timestamp'].tolist(),
+                    waves[chunk['brain_wave_type']].tolist()
+                )
+                with conn:
+                    conn.executemany('''
+                        INSERT INTO ratings (user_id, movie_id, rating, timestamp, brain_wave_type)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', rows)
+                inserted += len(chunk['user_id'])
+        finally:
+            if rebuild_indexes:
+                with conn:
+                    for sql in RATINGS_INDEXES.values():
+                        conn.execute(sql)
+            conn.execute("PRAGMA synchronous=NORMAL")
+        with conn:
+            DatabaseManager.bump_data_version(conn.cursor(), 'ratings')
+    return inserted
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk-load synthetic movies and ratings')
+    parser.add_argument('--db', default='movies.db')
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--ratings-per-user', type=int, default=100)
+    parser.add_argument('--movies', type=int, default=0, help='synthetic movies to add before rating')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--first-user-id', type=int, default=1)
+    parser.add_argument('--keep-indexes', action='store_true', help='maintain indexes during the load')
+    args = parser.parse_args()
+
+    from data_fetcher import TMDBFetcher
+
+    db = DatabaseManager(args.db)
+    fetcher = TMDBFetcher(db)
+
+    started = time.perf_counter()
+    if args.movies:
+        first_id = max(db.get_movie_ids(), default=0) + 1
+        fetcher.save_movies_to_db(generate_movies(args.movies, args.seed, first_id))
+    movies_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    inserted = bulk_insert_ratings(
+        db,
+        generate_ratings(db.get_movie_ids(), args.users, args.ratings_per_user, args.seed, args.first_user_id),
+        rebuild_indexes=not args.keep_indexes
+    )
+    ratings_s = time.perf_counter() - started
+    db.close_all()
+
+    print(json.dumps({
+        'movies_added': args.movies,
+        'movies_s': round(movies_s, 3),
+        'ratings_inserted': inserted,
+        'ratings_s': round(ratings_s, 3),
+        'ratings_per_sec': round(inserted / ratings_s) if ratings_s > 0 else None,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
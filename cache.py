@@ -0,0 +1,78 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    # Thread-safe LRU map with an optional time-to-live. Expired entries are
+    # dropped lazily when they are looked up or pushed out by size.
+    def __init__(self, max_size=1024, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.counts = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.counts['misses'] += 1
+                return default
+            value, stored_at = entry
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                del self.entries[key]
+                self.counts['expirations'] += 1
+                self.counts['misses'] += 1
+                return default
+            self.entries.move_to_end(key)
+            self.counts['hits'] += 1
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.counts['evictions'] += 1
+
+    def get_or_compute(self, key, compute, still_valid=None):
+        # compute() runs outside the lock; two threads missing on the same key
+        # may both compute it, which is harmless for pure functions. When
+        # still_valid() is false after computing, the inputs changed meanwhile
+        # and the result is returned without being cached.
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            if still_valid is None or still_valid():
+                self.put(key, value)
+        return value
+
+    def discard(self, predicate):
+        with self.lock:
+            stale = [key for key in self.entries if predicate(key)]
+            for key in stale:
+                del self.entries[key]
+        return len(stale)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        with self.lock:
+            counts = dict(self.counts)
+            size = len(self.entries)
+        lookups = counts['hits'] + counts['misses']
+        return {
+            **counts,
+            'size': size,
+            'max_size': self.max_size,
+            'ttl_seconds': self.ttl,
+            'hit_rate': round(counts['hits'] / lookups, 4) if lookups else None,
+        }
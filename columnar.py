@@ -0,0 +1,310 @@
+import numpy as np
+import pandas as pd
+
+from wave_popularity import BRAIN_WAVES
+
+UNKNOWN_WAVE = 255
+UNKNOWN_ROW = -1
+# Rows appended after the indexes were built are found by a linear scan of
+# this tail; past these sizes the indexes are rebuilt over everything.
+MIN_REINDEX_TAIL = 65536
+REINDEX_FRACTION = 8
+MASK_BITS = 32
+INT32_MAX = np.iinfo(np.int32).max
+UINT32_MAX = np.iinfo(np.uint32).max
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def catalog_rows(movie_ids, catalog_ids):
+    # Position of each movie id in the catalog, UNKNOWN_ROW where it is not
+    # there, via a binary search instead of a per-row dict lookup.
+    movie_ids = np.asarray(movie_ids)
+    rows = np.full(len(movie_ids), UNKNOWN_ROW, dtype=np.int32)
+    if len(catalog_ids) == 0 or len(movie_ids) == 0:
+        return rows
+    order = np.argsort(catalog_ids, kind='stable')
+    sorted_ids = np.asarray(catalog_ids)[order]
+    pos = np.minimum(np.searchsorted(sorted_ids, movie_ids), len(sorted_ids) - 1)
+    found = sorted_ids[pos] == movie_ids
+    rows[found] = order[pos[found]]
+    return rows
+
+
+def popcount(masks):
+    # Set bits per uint32, via a byte lookup table (numpy < 2 has no
+    # bitwise_count).
+    masks = np.ascontiguousarray(masks, dtype=np.uint32)
+    return POPCOUNT[masks.view(np.uint8)].reshape(masks.shape + (4,)).sum(axis=-1)
+
+
+def is_integer(value):
+    return isinstance(value, (int, np.integer)) and not isinstance(value, bool)
+
+
+class CSRIndex:
+    # Row numbers grouped by key: the rows holding a key are
+    # order[offsets[slot]:offsets[slot + 1]], in their original order. Small
+    # non-negative keys (user ids, most movie ids) are their own slot, so a
+    # lookup is two array reads; a sparse key space falls back to a binary
+    # search over the distinct keys.
+    def __init__(self, order, offsets, keys=None):
+        self.order = order
+        self.offsets = offsets
+        self.keys = keys
+
+    @classmethod
+    def build(cls, column):
+        n = len(column)
+        dtype = np.int32 if n < 2 ** 31 else np.int64
+        if n == 0:
+            return cls(np.empty(0, dtype=dtype), np.zeros(1, dtype=dtype))
+        order = np.argsort(column, kind='stable').astype(dtype)
+        low, high = int(column.min()), int(column.max())
+        if low >= 0 and high <= 2 * n + 1024:
+            offsets = np.zeros(high + 2, dtype=dtype)
+            np.cumsum(np.bincount(column, minlength=high + 1), out=offsets[1:])
+            return cls(order, offsets)
+        keys, starts = np.unique(column[order], return_index=True)
+        return cls(order, np.append(starts, n).astype(dtype), keys)
+
+    def slot(self, key):
+        if not is_integer(key):
+            return None
+        if self.keys is None:
+            return key if 0 <= key < len(self.offsets) - 1 else None
+        i = int(np.searchsorted(self.keys, key))
+        return i if i < len(self.keys) and self.keys[i] == key else None
+
+    def rows(self, key):
+        slot = self.slot(key)
+        if slot is None:
+            return self.order[:0]
+        return self.order[self.offsets[slot]:self.offsets[slot + 1]]
+
+    def counts(self):
+        keys = np.arange(len(self.offsets) - 1) if self.keys is None else self.keys
+        return keys, np.diff(self.offsets)
+
+    @property
+    def nbytes(self):
+        return self.order.nbytes + self.offsets.nbytes + (self.keys.nbytes if self.keys is not None else 0)
+
+
+class RatingStore:
+    # The ratings table as parallel typed columns in rowid order: int32 ids,
+    # the catalog row of each movie, float32 ratings, uint8 wave codes
+    # (index into BRAIN_WAVES) and uint32 timestamps. Stores are immutable;
+    # appending returns a new store that shares the old per-user and
+    # per-movie indexes for its prefix and scans only the new tail.
+    COLUMNS = ('user_ids', 'movie_ids', 'movie_rows', 'ratings', 'waves', 'timestamps')
+
+    def __init__(self, user_ids, movie_ids, movie_rows, ratings, waves, timestamps, indexes=None):
+        self.user_ids = user_ids
+        self.movie_ids = movie_ids
+        self.movie_rows = movie_rows
+        self.ratings = ratings
+        self.waves = waves
+        self.timestamps = timestamps
+        # (by_user, by_movie, rows covered), built on first lookup
+        self.indexes = indexes
+
+    @classmethod
+    def empty(cls):
+        return cls.from_frame(pd.DataFrame(columns=['user_id', 'movie_id', 'rating', 'brain_wave_type', 'timestamp']),
+                              np.empty(0, dtype=np.int64))
+
+    @classmethod
+    def from_frame(cls, df, catalog_ids):
+        # Rows whose ids or rating are NULL, non-numeric, fractional or out of
+        # int32 range are dropped rather than narrowed: one bad legacy row
+        # must not stop the whole table from loading, nor turn into a user
+        # INT32_MIN.
+        user_ids = pd.to_numeric(df['user_id'], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+        movie_ids = pd.to_numeric(df['movie_id'], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+        ratings = pd.to_numeric(df['rating'], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+        valid = np.isfinite(ratings)
+        for ids in (user_ids, movie_ids):
+            valid &= np.isfinite(ids) & (ids == np.floor(ids)) & (np.abs(ids) <= INT32_MAX)
+        if not valid.all():
+            df = df[valid]
+            user_ids, movie_ids, ratings = user_ids[valid], movie_ids[valid], ratings[valid]
+        movie_ids = movie_ids.astype(np.int32)
+        waves = pd.Index(BRAIN_WAVES).get_indexer(df['brain_wave_type'])
+        timestamps = pd.to_numeric(df['timestamp'], errors='coerce').fillna(0).clip(0, UINT32_MAX)
+        return cls(
+            user_ids.astype(np.int32),
+            movie_ids,
+            catalog_rows(movie_ids, catalog_ids),
+            ratings.astype(np.float32),
+            np.where(waves < 0, UNKNOWN_WAVE, waves).astype(np.uint8),
+            timestamps.to_numpy(dtype=np.uint32),
+        )
+
+    @classmethod
+    def load(cls, db, catalog_ids, after_rowid=0, chunk_size=200000):
+        # Reads the ratings past after_rowid in chunks and narrows each chunk
+        # right away, so the full table never sits in memory as int64 and
+        # Python string columns. Returns the store and the last rowid read.
+        parts, last_rowid = [], after_rowid
+        with db.get_connection() as conn:
+            chunks = pd.read_sql_query(
+                "SELECT rowid AS row_id, user_id, movie_id, rating, timestamp, brain_wave_type "
+                "FROM ratings WHERE rowid > ? ORDER BY rowid",
+                conn, params=(after_rowid,), chunksize=chunk_size
+            )
+            for chunk in chunks:
+                if not chunk.empty:
+                    last_rowid = int(chunk['row_id'].iloc[-1])
+                    parts.append(cls.from_frame(chunk, catalog_ids))
+        if not parts:
+            return cls.empty(), last_rowid
+        return cls.concat(parts), last_rowid
+
+    @classmethod
+    def concat(cls, stores, indexes=None):
+        if len(stores) == 1:
+            store = stores[0]
+            return cls(*(getattr(store, name) for name in cls.COLUMNS), indexes or store.indexes)
+        return cls(*(np.concatenate([getattr(s, name) for s in stores]) for name in cls.COLUMNS), indexes)
+
+    def append(self, other):
+        if len(other) == 0:
+            return self
+        return RatingStore.concat([self, other], self.indexes)
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def tail(self, start):
+        return RatingStore(*(getattr(self, name)[start:] for name in self.COLUMNS))
+
+    def ensure_indexes(self):
+        indexes = self.indexes
+        covered = indexes[2] if indexes is not None else 0
+        if indexes is None or len(self) - covered > max(MIN_REINDEX_TAIL, covered // REINDEX_FRACTION):
+            indexes = (CSRIndex.build(self.user_ids), CSRIndex.build(self.movie_ids), len(self))
+            self.indexes = indexes
+        return indexes
+
+    def _lookup(self, which, column, key):
+        index = self.ensure_indexes()
+        rows, covered = index[which].rows(key), index[2]
+        if covered < len(self) and is_integer(key):
+            extra = np.flatnonzero(column[covered:] == key)
+            if len(extra):
+                rows = np.concatenate([rows, extra.astype(rows.dtype) + covered])
+        return rows
+
+    def rows_for_user(self, user_id):
+        return self._lookup(0, self.user_ids, user_id)
+
+    def rows_for_movie(self, movie_id):
+        return self._lookup(1, self.movie_ids, movie_id)
+
+    def user_movies(self, user_id):
+        return self.movie_ids[self.rows_for_user(user_id)]
+
+    def user_history(self, user_id):
+        rows = self.rows_for_user(user_id)
+        return self.movie_ids[rows], self.ratings[rows]
+
+    def movie_history(self, movie_id):
+        rows = self.rows_for_movie(movie_id)
+        return self.user_ids[rows], self.ratings[rows]
+
+    def most_active_users(self, n):
+        # Ranked by the indexed prefix; the unindexed tail is small enough not
+        # to change who the heaviest raters are.
+        keys, counts = self.ensure_indexes()[0].counts()
+        top = np.argsort(-counts, kind='stable')[:n]
+        return keys[top][counts[top] > 0].tolist()
+
+    def to_frame(self, columns=('user_id', 'movie_id', 'rating')):
+        names = {'user_id': 'user_ids', 'movie_id': 'movie_ids', 'rating': 'ratings', 'timestamp': 'timestamps'}
+        return pd.DataFrame({column: getattr(self, names[column]) for column in columns})
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in self.COLUMNS)
+
+    @property
+    def index_nbytes(self):
+        if self.indexes is None:
+            return 0
+        return self.indexes[0].nbytes + self.indexes[1].nbytes
+
+
+class GenreTokens:
+    # Every movie's genres as small token ids in CSR layout: movie row r has
+    # tokens[offsets[r]:offsets[r + 1]], and vocab maps a token back to its
+    # TMDB genre id. masks holds the same sets as one uint32 per movie (bit t
+    # for token t) so filters and overlap scores are bitwise array ops. TMDB
+    # has 19 genres; tokens past 31 stay in the CSR but not in the masks.
+    def __init__(self, vocab, offsets, tokens, masks):
+        self.vocab = vocab
+        self.offsets = offsets
+        self.tokens = tokens
+        self.masks = masks
+
+    @classmethod
+    def from_pairs(cls, movie_rows, genre_ids, n_movies):
+        # (catalog row, TMDB genre id) pairs, e.g. the movie_genres table;
+        # rows outside the catalog are dropped.
+        movie_rows = np.asarray(movie_rows, dtype=np.int64)
+        genre_ids = np.asarray(genre_ids, dtype=np.int64)
+        keep = (movie_rows >= 0) & (movie_rows < n_movies)
+        movie_rows, genre_ids = movie_rows[keep], genre_ids[keep]
+        order = np.lexsort((genre_ids, movie_rows))
+        movie_rows, genre_ids = movie_rows[order], genre_ids[order]
+
+        vocab, tokens = np.unique(genre_ids, return_inverse=True)
+        offsets = np.zeros(n_movies + 1, dtype=np.int32)
+        np.cumsum(np.bincount(movie_rows, minlength=n_movies), out=offsets[1:])
+        masks = np.zeros(n_movies, dtype=np.uint32)
+        in_mask = tokens < MASK_BITS
+        np.bitwise_or.at(masks, movie_rows[in_mask], (np.uint32(1) << tokens[in_mask].astype(np.uint32)))
+        return cls(vocab.astype(np.int32), offsets, tokens.astype(np.uint8 if len(vocab) <= 256 else np.int32), masks)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def movie_tokens(self, row):
+        return self.tokens[self.offsets[row]:self.offsets[row + 1]]
+
+    def genre_ids(self, row):
+        return self.vocab[self.movie_tokens(row)]
+
+    def token_rows(self):
+        # Movie row of every token, for vectorized per-movie reductions.
+        return np.repeat(np.arange(len(self), dtype=np.int32), np.diff(self.offsets))
+
+    def mask_of(self, genre_ids):
+        # Bits for the given TMDB genre ids; ids not in the catalog add none.
+        genre_ids = np.asarray(genre_ids, dtype=np.int64).ravel()
+        tokens = np.searchsorted(self.vocab, genre_ids)
+        found = tokens < len(self.vocab)
+        found[found] = self.vocab[tokens[found]] == genre_ids[found]
+        tokens = tokens[found & (tokens < MASK_BITS)].astype(np.uint32)
+        return np.bitwise_or.reduce(np.uint32(1) << tokens, initial=np.uint32(0))
+
+    def matching(self, genre_ids, match_all=False):
+        # Catalog rows tagged with any (or all) of genre_ids, as a bool mask.
+        want = self.mask_of(genre_ids)
+        hits = self.masks & want
+        return hits == want if match_all else hits != 0
+
+    def overlap(self, row):
+        # Jaccard similarity of every movie's genre set to movie row's.
+        mask = self.masks[row]
+        union = popcount(self.masks | mask)
+        return np.divide(popcount(self.masks & mask), union, out=np.zeros(len(self)), where=union > 0)
+
+    def text(self):
+        # Space-joined genre ids per movie, the form the TF-IDF features use.
+        names = self.vocab.astype(str)
+        return [' '.join(names[self.tokens[start:end]]) for start, end in zip(self.offsets[:-1].tolist(),
+                                                                             self.offsets[1:].tolist())]
+
+    @property
+    def nbytes(self):
+        return self.vocab.nbytes + self.offsets.nbytes + self.tokens.nbytes + self.masks.nbytes
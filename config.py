@@ -1,3 +1,4 @@
+import json
 import os
 from dotenv import load_dotenv
 
@@ -5,8 +6,45 @@ load_dotenv()
 
 class Config:
     TMDB_API_KEY = os.getenv('TMDB_API_KEY', 'your_tmdb_api_key_here')
+    TMDB_BASE_URL = os.getenv('TMDB_BASE_URL', 'https://api.themoviedb.org/3')
     DATABASE_PATH = 'movies.db'
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-key-2026')
     DEBUG = True
     PORT = 5000
     HOST = '0.0.0.0'
+    ONLINE_SGD_STEPS = int(os.getenv('ONLINE_SGD_STEPS', 5))
+    ONLINE_LEARNING_RATE = float(os.getenv('ONLINE_LEARNING_RATE', 0.01))
+    ONLINE_REGULARIZATION = float(os.getenv('ONLINE_REGULARIZATION', 0.02))
+    RETRAIN_AFTER_RATINGS = int(os.getenv('RETRAIN_AFTER_RATINGS', 500))
+    SIMILARITY_TOP_K = int(os.getenv('SIMILARITY_TOP_K', 50))
+    ANN_MIN_ITEMS = int(os.getenv('ANN_MIN_ITEMS', 20000))
+    ANN_LISTS = int(os.getenv('ANN_LISTS', 0)) or None
+    ANN_PROBE = int(os.getenv('ANN_PROBE', 8))
+    ANN_CANDIDATES = int(os.getenv('ANN_CANDIDATES', 200))
+    MODEL_DIR = os.getenv('MODEL_DIR', 'models')
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 8))
+    SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', 20000))
+    SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 268435456))
+    WAVE_HALF_LIFE_DAYS = float(os.getenv('WAVE_HALF_LIFE_DAYS', 7))
+    WAVE_MIN_RATING = float(os.getenv('WAVE_MIN_RATING', 4.0))
+    TMDB_CACHE_DIR = os.getenv('TMDB_CACHE_DIR', '.tmdb_cache')
+    TMDB_CACHE_MAX_AGE = int(os.getenv('TMDB_CACHE_MAX_AGE', 0))
+    TMDB_MAX_WORKERS = int(os.getenv('TMDB_MAX_WORKERS', 4))
+    TMDB_RATE_PER_SEC = float(os.getenv('TMDB_RATE_PER_SEC', 20))
+    TMDB_MAX_RETRIES = int(os.getenv('TMDB_MAX_RETRIES', 4))
+    TMDB_MAX_BACKOFF = float(os.getenv('TMDB_MAX_BACKOFF', 30))
+    HYBRID_ALPHA = float(os.getenv('HYBRID_ALPHA', 0.5))
+    HYBRID_GENRE_WEIGHT = float(os.getenv('HYBRID_GENRE_WEIGHT', 0.2))
+    SVD_PARAMS = json.loads(os.getenv('SVD_PARAMS', '{"n_factors": 100, "n_epochs": 20}'))
+    TRAINING_MODE = os.getenv('TRAINING_MODE', 'process')
+    RECOMMENDATION_CACHE_SIZE = int(os.getenv('RECOMMENDATION_CACHE_SIZE', 10000))
+    CACHE_WARM_USERS = int(os.getenv('CACHE_WARM_USERS', 100))
+    CACHE_WARM_N = int(os.getenv('CACHE_WARM_N', 10))
+    BRAIN_CACHE_SIZE = int(os.getenv('BRAIN_CACHE_SIZE', 4096))
+    BRAIN_CACHE_TTL = float(os.getenv('BRAIN_CACHE_TTL', 300))
+    BRAIN_BATCH_MAX = int(os.getenv('BRAIN_BATCH_MAX', 500))
+    SYNTHETIC_SEED = int(os.getenv('SYNTHETIC_SEED', 42))
+    PROFILE_SLOW_MS = float(os.getenv('PROFILE_SLOW_MS', 0))
+    PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0.1))
+    PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+    PRELOAD_COMPONENTS = [name for name in os.getenv('PRELOAD_COMPONENTS', '').split(',') if name]
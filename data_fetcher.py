@@ -1,86 +1,52 @@
-Sahar Sistani, [2/14/2026 3:11 PM]
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-class Config:
-    TMDB_API_KEY = os.getenv('TMDB_API_KEY', 'your_tmdb_api_key_here')
-    DATABASE_PATH = 'movies.db'
-    SECRET_KEY = os.getenv('SECRET_KEY', 'dev-key-2026')
-    DEBUG = True
-    PORT = 5000
-    HOST = '0.0.0.0'
-
-Sahar Sistani, [2/14/2026 3:12 PM]
-import requests
-import sqlite3
 import json
 from datetime import datetime
 from config import Config
+from database import DatabaseManager
+from ingestion import IngestionPipeline
+import bulk_loader
 
 class TMDBFetcher:
-    def init(self):
+    def __init__(self, db_manager, base_url=None, pipeline=None):
         self.api_key = Config.TMDB_API_KEY
-        self.base_url = 'https://api.themoviedb.org/3'
-        self.conn = sqlite3.connect(Config.DATABASE_PATH, check_same_thread=False)
+        self.base_url = base_url or Config.TMDB_BASE_URL
+        self.db = db_manager
+        self.pipeline = pipeline or IngestionPipeline(
+            self.base_url,
+            self.api_key,
+            cache_dir=Config.TMDB_CACHE_DIR,
+            max_workers=Config.TMDB_MAX_WORKERS,
+            rate_per_sec=Config.TMDB_RATE_PER_SEC,
+            max_retries=Config.TMDB_MAX_RETRIES,
+            max_backoff=Config.TMDB_MAX_BACKOFF,
+            cache_max_age=Config.TMDB_CACHE_MAX_AGE
+        )
         self.create_tables()
     
     def create_tables(self):
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS movies (
-                id INTEGER PRIMARY KEY,
-                title TEXT,
-                overview TEXT,
-                release_date TEXT,
-                vote_average REAL,
-                vote_count INTEGER,
-                genres TEXT,
-                poster_path TEXT,
-                popularity REAL
-            )
-        ''')
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS ratings (
-                user_id INTEGER,
-                movie_id INTEGER,
-                rating REAL,
-                timestamp INTEGER,
-                brain_wave_type TEXT,
-                FOREIGN KEY(movie_id) REFERENCES movies(id)
-            )
-        ''')
-        self.conn.commit()
+        self.db.migrate()
     
     def fetch_popular_movies(self, pages=5):
         movies = []
-        for page in range(1, pages + 1):
-            response = requests.get(
-                f'{self.base_url}/movie/popular',
-                params={'api_key': self.api_key, 'page': page}
-            )
-            if response.status_code == 200:
-                movies.extend(response.json()['results'])
+        for body in self.pipeline.fetch_pages('/movie/popular', pages):
+            if body is not None:
+                movies.extend(body['results'])
         return movies
     
     def fetch_movie_details(self, movie_id):
-        response = requests.get(
-            f'{self.base_url}/movie/{movie_id}',
-            params={'api_key': self.api_key}
-        )
-        if response.status_code == 200:
-            return response.json()
-        return None
+        return self.pipeline.get_json(f'/movie/{movie_id}')
+    
+    def fetch_movies_details(self, movie_ids):
+        bodies = self.pipeline.fetch_many([f'/movie/{movie_id}' for movie_id in movie_ids])
+        return {movie_id: body for movie_id, body in zip(movie_ids, bodies) if body is not None}
+    
+    def ingestion_stats(self):
+        stats = self.pipeline.last_stats
+        return stats.report() if stats else None
     
     def save_movies_to_db(self, movies):
-        cursor = self.conn.cursor()
-        for movie in movies:
-            cursor.execute('''
-                INSERT OR REPLACE INTO movies 
-                (id, title, overview, release_date, vote_average, vote_count, genres, poster_path, popularity)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
+        movies = list(movies)
+        rows = (
+            (
                 movie['id'],
                 movie['title'],
                 movie.get('overview', ''),
@@ -90,30 +56,39 @@ class TMDBFetcher:
                 json.dumps(movie.get('genre_ids', [])),
                 movie.get('poster_path', ''),
                 movie.get('popularity', 0)
-            ))
-        self.conn.commit()
+            )
+            for movie in movies
+        )
+        with self.db.transaction() as cursor:
+            changes_before = cursor.connection.total_changes
+            cursor.executemany('''
+                INSERT INTO movies 
+                (id, title, overview, release_date, vote_average, vote_count, genres, poster_path, popularity)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                    title = excluded.title,
+                    overview = excluded.overview,
+                    release_date = excluded.release_date,
+                    vote_average = excluded.vote_average,
+                    vote_count = excluded.vote_count,
+                    genres = excluded.genres,
+                    poster_path = excluded.poster_path,
+                    popularity = excluded.popularity
+                WHERE (title, overview, release_date, vote_average, vote_count, genres, poster_path, popularity)
+                    IS NOT (excluded.title, excluded.overview, excluded.release_date, excluded.vote_average,
+                            excluded.vote_count, excluded.genres, excluded.poster_path, excluded.popularity)
+            ''', rows)
+            changed = cursor.connection.total_changes > changes_before
+            # movie_genres is the normalized copy of the genres column.
+            cursor.executemany("DELETE FROM movie_genres WHERE movie_id = ?", ((movie['id'],) for movie in movies))
+            cursor.executemany(
+                "INSERT OR IGNORE INTO movie_genres (movie_id, genre_id) VALUES (?, ?)",
+                ((movie['id'], int(genre_id)) for movie in movies for genre_id in movie.get('genre_ids', []))
+            )
+            if changed:
+                DatabaseManager.bump_data_version(cursor, 'movies')
     
-    def generate_synthetic_ratings(self, num_users=100, ratings_per_user=20):
-        import random
-        import time
-        
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT id FROM movies")
-        movie_ids = [row[0] for row in cursor.fetchall()]
-        
-        brain_waves = ['alpha', 'beta', 'gamma', 'delta', 'theta']
-        
-        for user_id in range(1, num_users + 1):
-            sampled_movies = random.sample(movie_ids, min(ratings_per_user, len(movie_ids)))
-            for movie_id in sampled_movies:
-                rating = random.uniform(0.5, 5.0)
-                rating = round(rating * 2) / 2
-                timestamp = int(time.time()) - random.randint(0, 31536000)
-                brain_wave = random.choice(brain_waves)
-                
-                cursor.execute('''
-                    INSERT INTO ratings (user_id, movie_id, rating, timestamp, brain_wave_type)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (user_id, movie_id, rating, timestamp, brain_wave))
-        
-        self.conn.commit()
+    def generate_synthetic_ratings(self, num_users=100, ratings_per_user=20, seed=None):
+        movie_ids = self.db.get_movie_ids()
+        chunks = bulk_loader.generate_ratings(movie_ids, num_users, ratings_per_user, seed)
+        return bulk_loader.bulk_insert_ratings(self.db, chunks, rebuild_indexes=False)
@@ -0,0 +1,89 @@
+import threading
+import time
+from collections import deque
+
+from columnar import GenreTokens, RatingStore, catalog_rows
+from wave_popularity import WavePopularity
+
+
+class DataSnapshot:
+    # Read-only view of the movies and ratings tables at a given data version.
+    # A refresh builds a new snapshot and swaps the reference; existing
+    # snapshots are never modified, so readers can keep using the one they hold.
+    def __init__(self, version, movies_df, ratings, last_rating_rowid, movie_ids=None, movie_index=None,
+                 wave_popularity=None, genres=None):
+        self.version = version
+        self.movies_df = movies_df
+        self.ratings = ratings
+        self.movie_ids = movies_df['id'].to_numpy() if movie_ids is None else movie_ids
+        if movie_index is None:
+            movie_index = {movie_id: i for i, movie_id in enumerate(self.movie_ids.tolist())}
+        self.movie_index = movie_index
+        self.wave_popularity = wave_popularity
+        self.genres = genres
+        self.last_rating_rowid = last_rating_rowid
+        self.loaded_at = time.time()
+
+    @classmethod
+    def load(cls, db, version, half_life_days=7.0, min_rating=4.0):
+        movies_df = db.get_all_movies()
+        movie_ids = movies_df['id'].to_numpy()
+        pairs = db.get_movie_genres()
+        genres = GenreTokens.from_pairs(catalog_rows(pairs['movie_id'].to_numpy(), movie_ids),
+                                        pairs['genre_id'].to_numpy(), len(movies_df))
+        movies_df['genres'] = genres.text()
+        ratings, last_rowid = RatingStore.load(db, movie_ids)
+        return cls(
+            version, movies_df, ratings, last_rowid, movie_ids,
+            wave_popularity=WavePopularity.from_ratings(ratings, len(movies_df), half_life_days, min_rating),
+            genres=genres,
+        )
+
+    def with_new_ratings(self, db, version):
+        # Ratings are only ever appended, so when just the ratings version moved
+        # it is enough to fetch the rows past the last rowid we have seen.
+        new_rows, last_rowid = RatingStore.load(db, self.movie_ids, self.last_rating_rowid)
+        wave_popularity = self.wave_popularity
+        if len(new_rows):
+            # The new rows go into a copy of the popularity aggregate (a few
+            # waves x movies matrices), so readers of this snapshot never see
+            # a half-applied update.
+            wave_popularity = wave_popularity.copy()
+            wave_popularity.add_ratings(new_rows)
+        return DataSnapshot(version, self.movies_df, self.ratings.append(new_rows), last_rowid, self.movie_ids,
+                            self.movie_index, wave_popularity, self.genres)
+
+    def age(self):
+        return time.time() - self.loaded_at
+
+
+class SnapshotMetrics:
+    def __init__(self, history=100):
+        self.lock = threading.Lock()
+        self.reloads = deque(maxlen=history)
+        self.counts = {'full': 0, 'incremental': 0}
+        self.total_seconds = 0.0
+
+    def record(self, kind, seconds):
+        with self.lock:
+            self.reloads.append(seconds)
+            self.counts[kind] += 1
+            self.total_seconds += seconds
+
+    def report(self, snapshot):
+        with self.lock:
+            recent = list(self.reloads)
+            counts = dict(self.counts)
+            total = self.total_seconds
+        return {
+            'version': list(snapshot.version) if snapshot else None,
+            'age_seconds': round(snapshot.age(), 3) if snapshot else None,
+            'movies': len(snapshot.movies_df) if snapshot else 0,
+            'ratings': len(snapshot.ratings) if snapshot else 0,
+            'ratings_bytes': snapshot.ratings.nbytes + snapshot.ratings.index_nbytes if snapshot else 0,
+            'reloads': counts,
+            'reload_seconds_total': round(total, 6),
+            'last_reload_ms': round(recent[-1] * 1000, 3) if recent else None,
+            'avg_reload_ms': round(sum(recent) / len(recent) * 1000, 3) if recent else None,
+            'max_reload_ms': round(max(recent) * 1000, 3) if recent else None,
+        }
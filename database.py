@@ -1,51 +1,188 @@
 import sqlite3
-import pandas as pd
+import queue
+import threading
 import time
 from contextlib import contextmanager
 
+import migrations
+from metrics import stage
+
+def read_sql_query(*args, **kwargs):
+    # pandas is imported on first use: the pool, migrations and the row-based
+    # queries behind /api/movies/popular don't need it.
+    import pandas as pd
+    return pd.read_sql_query(*args, **kwargs)
+
 class DatabaseManager:
-    def init(self, db_path='movies.db'):
+    def __init__(self, db_path='movies.db', pool_size=8, cache_size_kb=20000, mmap_size=268435456):
         self.db_path = db_path
+        self.pool_size = pool_size
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self.idle = queue.LifoQueue()
+        self.local = threading.local()
+        self.rating_listeners = []
+    
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=256, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kb)}")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
     
     @contextmanager
     def get_connection(self):
-        conn = sqlite3.connect(self.db_path)
+        # A thread keeps the same pooled connection for nested calls and hands
+        # it back when the outermost block exits. Connections stay open, so
+        # sqlite3's per-connection statement cache is reused across requests.
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            self.local.depth += 1
+            try:
+                yield conn
+            finally:
+                self.local.depth -= 1
+            return
+        
         try:
-            yield conn
+            conn = self.idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        self.local.conn = conn
+        self.local.depth = 1
+        try:
+            # Timed once per outermost block: SQL plus reading the results.
+            with stage('sqlite'):
+                yield conn
         finally:
-            conn.close()
+            self.local.conn = None
+            if conn.in_transaction:
+                conn.rollback()
+            if self.idle.qsize() < self.pool_size:
+                self.idle.put(conn)
+            else:
+                conn.close()
+    
+    @contextmanager
+    def transaction(self):
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                yield cursor
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    
+    def migrate(self):
+        with self.get_connection() as conn:
+            return migrations.migrate(conn)
+    
+    def explain_query_plan(self, sql, params=()):
+        with self.get_connection() as conn:
+            return [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+    
+    def pool_stats(self):
+        return {'idle': self.idle.qsize(), 'pool_size': self.pool_size}
+    
+    def close_all(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
     
     def get_all_movies(self):
         with self.get_connection() as conn:
-            df = pd.read_sql_query("SELECT * FROM movies", conn)
+            df = read_sql_query("SELECT * FROM movies", conn)
+        return df
+    
+    def get_movie_genres(self):
+        with self.get_connection() as conn:
+            df = read_sql_query("SELECT movie_id, genre_id FROM movie_genres", conn)
         return df
     
     def get_all_ratings(self):
         with self.get_connection() as conn:
-            df = pd.read_sql_query("SELECT * FROM ratings", conn)
+            df = read_sql_query("SELECT * FROM ratings", conn)
         return df
     
+    def get_ratings_since(self, rowid):
+        with self.get_connection() as conn:
+            df = read_sql_query(
+                "SELECT rowid AS row_id, * FROM ratings WHERE rowid > ? ORDER BY rowid",
+                conn,
+                params=(rowid,)
+            )
+        return df
+    
+    def get_data_version(self):
+        with self.get_connection() as conn:
+            rows = dict(conn.execute("SELECT name, version FROM data_versions").fetchall())
+        return (rows.get('movies', 0), rows.get('ratings', 0))
+    
+    @staticmethod
+    def bump_data_version(cursor, name):
+        cursor.execute(
+            "UPDATE data_versions SET version = version + 1 WHERE name = ?",
+            (name,)
+        )
+    
     def get_user_ratings(self, user_id):
         with self.get_connection() as conn:
-            df = pd.read_sql_query(
-                f"SELECT * FROM ratings WHERE user_id = {user_id}", 
-                conn
+            df = read_sql_query(
+                "SELECT * FROM ratings WHERE user_id = ?", 
+                conn,
+                params=(user_id,)
             )
         return df
     
     def get_movie_by_id(self, movie_id):
         with self.get_connection() as conn:
-            df = pd.read_sql_query(
-                f"SELECT * FROM movies WHERE id = {movie_id}", 
-                conn
+            df = read_sql_query(
+                "SELECT * FROM movies WHERE id = ?", 
+                conn,
+                params=(movie_id,)
             )
         return df.iloc[0] if not df.empty else None
     
-    def add_rating(self, user_id, movie_id, rating, brain_wave):
+    def get_movie_ids(self):
         with self.get_connection() as conn:
-            cursor = conn.cursor()
+            return [row[0] for row in conn.execute("SELECT id FROM movies")]
+    
+    def count_ratings(self):
+        with self.get_connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM ratings").fetchone()[0]
+    
+    def get_popular_movies(self, limit, offset):
+        with self.get_connection() as conn:
+            return conn.execute(
+                "SELECT * FROM movies ORDER BY popularity DESC, id DESC LIMIT ? OFFSET ?",
+                (limit, offset)
+            ).fetchall()
+    
+    def get_popular_movies_after(self, popularity, movie_id, limit):
+        # Keyset pagination: seek straight to the last row of the previous page
+        # through idx_movies_popularity instead of skipping OFFSET rows.
+        with self.get_connection() as conn:
+            return conn.execute(
+                "SELECT * FROM movies WHERE (popularity, id) < (?, ?) "
+                "ORDER BY popularity DESC, id DESC LIMIT ?",
+                (popularity, movie_id, limit)
+            ).fetchall()
+    
+    def add_rating_listener(self, listener):
+        # listener(user_id, movie_id, rating) runs after each add_rating commit.
+        self.rating_listeners.append(listener)
+    
+    def add_rating(self, user_id, movie_id, rating, brain_wave):
+        with self.transaction() as cursor:
             cursor.execute('''
                 INSERT INTO ratings (user_id, movie_id, rating, timestamp, brain_wave_type)
                 VALUES (?, ?, ?, ?, ?)
             ''', (user_id, movie_id, rating, int(time.time()), brain_wave))
-            conn.commit()
+            self.bump_data_version(cursor, 'ratings')
+        for listener in self.rating_listeners:
+            listener(user_id, movie_id, rating)
@@ -0,0 +1,198 @@
+import argparse
+import itertools
+import json
+import os
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from surprise import SVD, Dataset, Reader
+
+from svd_scorer import SVDScorer
+
+PARAM_GRID = {
+    'n_factors': [50, 100],
+    'n_epochs': [20, 30],
+    'lr_all': [0.005, 0.01],
+    'reg_all': [0.02, 0.05],
+}
+
+# Bounds for random search: (low, high, log scale, integer)
+PARAM_SPACE = {
+    'n_factors': (20, 200, True, True),
+    'n_epochs': (10, 40, False, True),
+    'lr_all': (0.002, 0.02, True, False),
+    'reg_all': (0.005, 0.1, True, False),
+}
+
+
+def grid_configs(grid=None):
+    grid = grid or PARAM_GRID
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def random_configs(n, space=None, seed=42):
+    space = space or PARAM_SPACE
+    rng = np.random.default_rng(seed)
+    configs = []
+    for _ in range(n):
+        config = {}
+        for name, (low, high, log, integer) in space.items():
+            value = np.exp(rng.uniform(np.log(low), np.log(high))) if log else rng.uniform(low, high)
+            config[name] = int(round(value)) if integer else round(float(value), 5)
+        configs.append(config)
+    return configs
+
+
+def kfold_indices(n_rows, k=5, seed=42):
+    order = np.random.default_rng(seed).permutation(n_rows)
+    return np.array_split(order, k)
+
+
+def fit_svd(ratings_df, params, seed=42):
+    reader = Reader(rating_scale=(0.5, 5.0))
+    data = Dataset.load_from_df(ratings_df[['user_id', 'movie_id', 'rating']], reader)
+    model = SVD(random_state=seed, **params)
+    model.fit(data.build_full_trainset())
+    return model
+
+
+def rmse(scorer, ratings_df):
+    predictions = scorer.predict_pairs(ratings_df['user_id'].tolist(), ratings_df['movie_id'].tolist())
+    return float(np.sqrt(np.mean((predictions - ratings_df['rating'].to_numpy()) ** 2)))
+
+
+def ranking_metrics(scorer, train_df, test_df, k=10, threshold=4.0):
+    # Ranks every movie seen in the data for each test user, skipping what
+    # they rated in training. A held-out rating >= threshold is a relevant
+    # hit. NDCG uses binary gains.
+    movie_ids = np.union1d(train_df['movie_id'].unique(), test_df['movie_id'].unique())
+    relevant = test_df[test_df['rating'] >= threshold].groupby('user_id')['movie_id'].apply(set)
+    if relevant.empty:
+        return {'precision_at_k': None, 'ndcg_at_k': None, 'users': 0}
+    user_ids = relevant.index.tolist()
+    seen = train_df[train_df['user_id'].isin(user_ids)]
+    exclude = {uid: group.to_numpy() for uid, group in seen.groupby('user_id')['movie_id']}
+    top = scorer.top_n_batch(user_ids, movie_ids, exclude, k)
+
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    precision, ndcg = [], []
+    for uid in user_ids:
+        hits = np.array([movie_ids[row] in relevant[uid] for row in top[uid][0]], dtype=float)
+        precision.append(hits.sum() / k)
+        ideal = discounts[:min(len(relevant[uid]), k)].sum()
+        ndcg.append((hits * discounts[:len(hits)]).sum() / ideal)
+    return {
+        'precision_at_k': round(float(np.mean(precision)), 5),
+        'ndcg_at_k': round(float(np.mean(ndcg)), 5),
+        'users': len(user_ids),
+    }
+
+
+_ratings = None
+
+
+def _init_worker(ratings_df):
+    global _ratings
+    _ratings = ratings_df
+
+
+def evaluate_config(params, k_folds=5, top_k=10, threshold=4.0, seed=42, ratings_df=None):
+    # Cross-validates one parameter set. Runs in a pool worker, which holds
+    # the ratings frame from _init_worker rather than receiving it per task.
+    ratings_df = _ratings if ratings_df is None else ratings_df
+    folds = kfold_indices(len(ratings_df), k_folds, seed)
+    fold_results = []
+    for i, test_rows in enumerate(folds):
+        train_rows = np.concatenate([fold for j, fold in enumerate(folds) if j != i])
+        train_df, test_df = ratings_df.iloc[train_rows], ratings_df.iloc[test_rows]
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        scorer = SVDScorer.from_model(fit_svd(train_df, params, seed))
+        fit_s = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        fold_results.append({
+            'rmse': rmse(scorer, test_df),
+            'fit_s': fit_s,
+            'peak_bytes': peak,
+            **ranking_metrics(scorer, train_df, test_df, top_k, threshold),
+        })
+
+    def mean(name, digits=5):
+        values = [fold[name] for fold in fold_results if fold[name] is not None]
+        return round(float(np.mean(values)), digits) if values else None
+
+    return {
+        'params': params,
+        'rmse': mean('rmse'),
+        'rmse_std': round(float(np.std([fold['rmse'] for fold in fold_results])), 5),
+        'precision_at_k': mean('precision_at_k'),
+        'ndcg_at_k': mean('ndcg_at_k'),
+        'fit_s': mean('fit_s', 4),
+        'peak_bytes': int(max(fold['peak_bytes'] for fold in fold_results)),
+        'pid': os.getpid(),
+    }
+
+
+def search(ratings_df, configs, k_folds=5, top_k=10, threshold=4.0, seed=42, workers=None, metric='rmse'):
+    # One config per task across a process pool; each worker gets the ratings
+    # once through the initializer.
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker,
+                             initargs=(ratings_df,)) as pool:
+        futures = [pool.submit(evaluate_config, params, k_folds, top_k, threshold, seed) for params in configs]
+        results = [future.result() for future in futures]
+
+    descending = metric in ('precision_at_k', 'ndcg_at_k')
+    results.sort(key=lambda r: (r[metric] is None, -(r[metric] or 0) if descending else (r[metric] or 0)))
+    return {
+        'metric': metric,
+        'folds': k_folds,
+        'k': top_k,
+        'ratings': len(ratings_df),
+        'configs': len(configs),
+        'elapsed_s': round(time.perf_counter() - started, 3),
+        'best': results[0] if results else None,
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cross-validated SVD hyperparameter search')
+    parser.add_argument('--db', default='movies.db')
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--k', type=int, default=10, help='cutoff for precision@k and NDCG@k')
+    parser.add_argument('--threshold', type=float, default=4.0, help='rating that counts as relevant')
+    parser.add_argument('--random', type=int, default=0, help='sample N random configs instead of the grid')
+    parser.add_argument('--metric', default='rmse', choices=['rmse', 'precision_at_k', 'ndcg_at_k'])
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--model-dir', default=None, help='retrain the best config on all ratings and save it here')
+    args = parser.parse_args()
+
+    from database import DatabaseManager
+
+    db = DatabaseManager(args.db)
+    ratings_df = db.get_all_ratings()[['user_id', 'movie_id', 'rating']]
+    configs = random_configs(args.random, seed=args.seed) if args.random else grid_configs()
+    report = search(ratings_df, configs, args.folds, args.k, args.threshold, args.seed, args.workers, args.metric)
+
+    if args.model_dir and report['best'] is not None:
+        from model_store import ModelStore
+        from recommender import HybridRecommender
+
+        recommender = HybridRecommender(db, model_store=ModelStore(args.model_dir), cache_size=1, warm_users=0,
+                                        svd_params=report['best']['params'])
+        bundle = recommender.build_model(recommender.load_data())
+        report['saved'] = {'path': recommender.model_store.save(bundle), 'train_rmse': bundle.train_rmse}
+    db.close_all()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class ResponseCache:
+    # One JSON file per request holding the body and its validators (ETag /
+    # Last-Modified), so a re-ingestion can ask the server for 304s.
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, url, params):
+        # The API key is left out so rotating it does not invalidate the cache.
+        params = sorted((k, str(v)) for k, v in (params or {}).items() if k != 'api_key')
+        return hashlib.sha1(json.dumps([url, params]).encode()).hexdigest()
+
+    def get(self, key):
+        try:
+            with open(os.path.join(self.directory, f'{key}.json')) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def put(self, key, body, etag=None, last_modified=None):
+        entry = {'body': body, 'etag': etag, 'last_modified': last_modified, 'stored_at': time.time()}
+        path = os.path.join(self.directory, f'{key}.json')
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+        return entry
+
+    def touch(self, key, entry):
+        entry['stored_at'] = time.time()
+        return self.put(key, entry['body'], entry.get('etag'), entry.get('last_modified'))
+
+
+class IngestionStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.elapsed = None
+        self.counts = {'pages': 0, 'requests': 0, 'cache_hits': 0, 'not_modified': 0, 'retries': 0, 'errors': 0}
+
+    def add(self, name, value=1):
+        with self.lock:
+            self.counts[name] += value
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+        return self
+
+    def report(self):
+        elapsed = self.elapsed if self.elapsed is not None else time.perf_counter() - self.started
+        pages = self.counts['pages']
+        return {
+            **self.counts,
+            'elapsed_s': round(elapsed, 4),
+            'pages_per_sec': round(pages / elapsed, 2) if elapsed > 0 else None,
+            'cache_hit_rate': round(self.counts['cache_hits'] / pages, 4) if pages else None,
+        }
+
+
+class IngestionPipeline:
+    def __init__(self, base_url, api_key, cache_dir=None, max_workers=4, rate_per_sec=20.0,
+                 max_retries=4, backoff=0.5, max_backoff=30.0, timeout=10, cache_max_age=0, session=None):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.cache = ResponseCache(cache_dir) if cache_dir else None
+        self.cache_max_age = cache_max_age
+        self.max_workers = max_workers
+        self.bucket = TokenBucket(rate_per_sec)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.session = session or self._build_session(max_workers)
+        self.last_stats = None
+
+    @staticmethod
+    def _build_session(max_workers):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def get_json(self, path, params=None, stats=None):
+        stats = stats or IngestionStats()
+        url = f'{self.base_url}{path}'
+        params = dict(params or {})
+        key = self.cache.key(url, params) if self.cache else None
+        cached = self.cache.get(key) if self.cache else None
+
+        if cached is not None and self.cache_max_age and time.time() - cached['stored_at'] < self.cache_max_age:
+            stats.add('cache_hits')
+            return cached['body']
+
+        headers = {}
+        if cached is not None:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            stats.add('requests')
+            try:
+                response = self.session.get(
+                    url, params={**params, 'api_key': self.api_key}, headers=headers, timeout=self.timeout
+                )
+            except requests.RequestException:
+                response = None
+
+            if response is not None and response.status_code == 304 and cached is not None:
+                stats.add('cache_hits')
+                stats.add('not_modified')
+                self.cache.touch(key, cached)
+                return cached['body']
+            if response is not None and response.status_code == 200:
+                body = response.json()
+                if self.cache:
+                    self.cache.put(key, body, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+                return body
+            if response is not None and response.status_code not in RETRY_STATUSES:
+                break
+            if attempt < self.max_retries:
+                stats.add('retries')
+                time.sleep(self._retry_delay(attempt, response))
+
+        stats.add('errors')
+        return None
+
+    def _retry_delay(self, attempt, response):
+        # Full jitter: a random wait up to the exponential backoff, or the
+        # server's Retry-After when it sends one. Both are capped at
+        # max_backoff so a long Retry-After cannot stall a request handler.
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after:
+            try:
+                delay = float(retry_after)
+            except ValueError:
+                delay = None
+            if delay is not None and math.isfinite(delay):
+                return min(max(delay, 0.0), self.max_backoff)
+        return random.uniform(0, min(self.backoff * (2 ** attempt), self.max_backoff))
+
+    def fetch_pages(self, path, pages, params=None):
+        stats = IngestionStats()
+
+        def fetch(page):
+            body = self.get_json(path, {**(params or {}), 'page': page}, stats)
+            if body is not None:
+                stats.add('pages')
+            return body
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            bodies = list(pool.map(fetch, range(1, pages + 1)))
+        self.last_stats = stats.finish()
+        return bodies
+
+    def fetch_many(self, paths):
+        stats = IngestionStats()
+
+        def fetch(path):
+            body = self.get_json(path, stats=stats)
+            if body is not None:
+                stats.add('pages')
+            return body
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            bodies = list(pool.map(fetch, paths))
+        self.last_stats = stats.finish()
+        return bodies
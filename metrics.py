@@ -0,0 +1,176 @@
+import cProfile
+import itertools
+import os
+import random
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STAGE_METRIC = 'stage_duration_seconds'
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    )
+    return '{' + pairs + '}'
+
+
+def format_value(value):
+    if value is None:
+        return 'NaN'
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(int(value))
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+
+    def samples(self, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            yield '_bucket', labels + (('le', format_value(bound)),), cumulative
+        yield '_sum', labels, self.total
+        yield '_count', labels, cumulative
+
+
+class MetricsRegistry:
+    # Counters and histograms recorded in-process, plus callbacks read at
+    # scrape time for values other objects already track (cache stats, model
+    # version). Labels are tuples of (name, value) pairs. render() produces
+    # the Prometheus text exposition format.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.descriptions = {}
+        self.counters = {}
+        self.histograms = {}
+        self.callbacks = {}
+
+    def describe(self, name, kind, help_text):
+        self.descriptions[name] = (kind, help_text)
+
+    def inc(self, name, amount=1, labels=()):
+        with self.lock:
+            self.counters[(name, labels)] = self.counters.get((name, labels), 0) + amount
+
+    def observe(self, name, value, labels=(), buckets=DEFAULT_BUCKETS):
+        with self.lock:
+            histogram = self.histograms.get((name, labels))
+            if histogram is None:
+                histogram = self.histograms[(name, labels)] = Histogram(buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, labels=()):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, labels)
+
+    def register(self, name, kind, help_text, read):
+        # read() returns a number, or a dict of labels -> number. Registering a
+        # name again replaces its callback, so each create_app() call reports
+        # its own components.
+        self.describe(name, kind, help_text)
+        self.callbacks[name] = read
+
+    def collect(self):
+        # {name: [(suffix, labels, value)]}
+        series = {}
+        with self.lock:
+            for (name, labels), value in self.counters.items():
+                series.setdefault(name, []).append(('', labels, value))
+            for (name, labels), histogram in self.histograms.items():
+                series.setdefault(name, []).extend(histogram.samples(labels))
+        for name, read in list(self.callbacks.items()):
+            try:
+                value = read()
+            except Exception:
+                continue
+            values = value.items() if isinstance(value, dict) else [((), value)]
+            series.setdefault(name, []).extend(('', labels, v) for labels, v in values)
+        return series
+
+    def render(self):
+        lines = []
+        for name, samples in sorted(self.collect().items()):
+            kind, help_text = self.descriptions.get(name, ('untyped', ''))
+            if help_text:
+                lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for suffix, labels, value in samples:
+                lines.append(f'{name}{suffix}{format_labels(labels)} {format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+REGISTRY.describe('http_request_duration_seconds', 'histogram', 'Request latency by route')
+REGISTRY.describe('http_requests_total', 'counter', 'Requests by route, method and status')
+REGISTRY.describe('http_exceptions_total', 'counter', 'Exceptions caught in route handlers')
+REGISTRY.describe(STAGE_METRIC, 'histogram', 'Time spent in instrumented stages of a request or job')
+REGISTRY.describe('slow_request_profiles_total', 'counter', 'cProfile dumps written for slow requests')
+
+
+def stage(name):
+    # with stage('svd_scoring'): ... records into stage_duration_seconds.
+    return REGISTRY.timer(STAGE_METRIC, (('stage', name),))
+
+
+class SlowRequestProfiler:
+    # Opt-in: profiles a sample of requests with cProfile and writes the stats
+    # of those slower than threshold_ms to directory, for pstats or
+    # snakeviz. One request is profiled at a time; concurrent requests skip
+    # profiling rather than share a profiler.
+    def __init__(self, threshold_ms=0, sample_rate=1.0, directory='profiles', registry=REGISTRY):
+        self.threshold_ms = threshold_ms
+        self.sample_rate = sample_rate
+        self.directory = directory
+        self.registry = registry
+        self.enabled = threshold_ms > 0 and sample_rate > 0
+        self.lock = threading.Lock()
+        self.sequence = itertools.count(1)
+
+    def start(self):
+        if not self.enabled or random.random() >= self.sample_rate:
+            return None
+        if not self.lock.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler (a debugger, coverage) is already active.
+            self.lock.release()
+            return None
+        return profile
+
+    def stop(self, profile, name, seconds):
+        if profile is None:
+            return None
+        profile.disable()
+        self.lock.release()
+        if seconds * 1000 < self.threshold_ms:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', name).strip('_') or 'root'
+        name = f'{time.strftime("%Y%m%d-%H%M%S")}-{next(self.sequence)}-{int(seconds * 1000)}ms-{slug}.prof'
+        path = os.path.join(self.directory, name)
+        profile.dump_stats(path)
+        self.registry.inc('slow_request_profiles_total')
+        return path
@@ -0,0 +1,90 @@
+RATINGS_INDEXES = {
+    'idx_ratings_user_movie': "CREATE INDEX IF NOT EXISTS idx_ratings_user_movie ON ratings (user_id, movie_id)",
+    'idx_ratings_wave': "CREATE INDEX IF NOT EXISTS idx_ratings_wave ON ratings (brain_wave_type, rating, movie_id)",
+}
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version.
+# Append new entries; never edit one that has shipped.
+MIGRATIONS = [
+    (1, [
+        '''
+        CREATE TABLE IF NOT EXISTS movies (
+            id INTEGER PRIMARY KEY,
+            title TEXT,
+            overview TEXT,
+            release_date TEXT,
+            vote_average REAL,
+            vote_count INTEGER,
+            genres TEXT,
+            poster_path TEXT,
+            popularity REAL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS ratings (
+            user_id INTEGER,
+            movie_id INTEGER,
+            rating REAL,
+            timestamp INTEGER,
+            brain_wave_type TEXT,
+            FOREIGN KEY(movie_id) REFERENCES movies(id)
+        )
+        ''',
+    ]),
+    (2, [
+        '''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        "INSERT OR IGNORE INTO data_versions (name, version) VALUES ('movies', 0), ('ratings', 0)",
+    ]),
+    (3, [
+        *RATINGS_INDEXES.values(),
+        "CREATE INDEX IF NOT EXISTS idx_movies_popularity ON movies (popularity, id)",
+        "ANALYZE",
+    ]),
+    (4, [
+        '''
+        CREATE TABLE IF NOT EXISTS movie_genres (
+            movie_id INTEGER NOT NULL,
+            genre_id INTEGER NOT NULL,
+            PRIMARY KEY (movie_id, genre_id)
+        ) WITHOUT ROWID
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_movie_genres_genre ON movie_genres (genre_id, movie_id)",
+        # Backfill from the JSON column, which save_movies_to_db keeps writing.
+        '''
+        INSERT OR IGNORE INTO movie_genres (movie_id, genre_id)
+        SELECT movies.id, CAST(genre.value AS INTEGER)
+        FROM movies, json_each(CASE WHEN json_valid(movies.genres) THEN movies.genres ELSE '[]' END) AS genre
+        ''',
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    # BEGIN IMMEDIATE takes the write lock before user_version is re-read, so
+    # several workers starting at once apply each migration exactly once.
+    if schema_version(conn) >= LATEST_VERSION:
+        return schema_version(conn)
+
+    for version, statements in MIGRATIONS:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if schema_version(conn) < version:
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return schema_version(conn)
@@ -0,0 +1,60 @@
+import time
+
+
+class ModelNotReady(Exception):
+    # No collaborative model is published yet. Requests never fit one inline:
+    # the first of them starts the single-flight background training run and
+    # each gets the training status to report instead.
+    def __init__(self, status):
+        super().__init__('no model published yet; training reports progress')
+        self.status = status
+
+
+class ModelBundle:
+    # Every trained piece a request reads, bound to the snapshot it was built
+    # from. Bundles are built off to the side and published by replacing
+    # HybridRecommender.model in one assignment, so a reader that takes the
+    # reference once sees either the old model or the new one, never a mix.
+    # The only in-place change after publish is the scorer's online SGD.
+    def __init__(self, snapshot=None, svd_model=None, scorer=None, trained_rating_count=0, tfidf=None,
+                 tfidf_matrix=None, similarity_index=None, ann_index=None, svd_params=None, train_rmse=None,
+                 source=None):
+        self.snapshot = snapshot
+        self.svd_model = svd_model
+        self.scorer = scorer
+        self.trained_rating_count = trained_rating_count
+        self.tfidf = tfidf
+        self.tfidf_matrix = tfidf_matrix
+        self.similarity_index = similarity_index
+        self.ann_index = ann_index
+        self.svd_params = svd_params
+        self.train_rmse = train_rmse
+        self.source = source
+        self.created_at = time.time()
+
+    @property
+    def movie_ids(self):
+        return self.snapshot.movie_ids if self.snapshot is not None else None
+
+    @property
+    def movies_df(self):
+        return self.snapshot.movies_df if self.snapshot is not None else None
+
+    @property
+    def content_movie_ids(self):
+        return self.movie_ids if self.similarity_index is not None else None
+
+    @property
+    def ann_movie_ids(self):
+        return self.movie_ids if self.scorer is not None else None
+
+    def replace(self, **changes):
+        fields = {
+            'snapshot': self.snapshot, 'svd_model': self.svd_model, 'scorer': self.scorer,
+            'trained_rating_count': self.trained_rating_count, 'tfidf': self.tfidf,
+            'tfidf_matrix': self.tfidf_matrix, 'similarity_index': self.similarity_index,
+            'ann_index': self.ann_index, 'svd_params': self.svd_params, 'train_rmse': self.train_rmse,
+            'source': self.source,
+        }
+        fields.update(changes)
+        return ModelBundle(**fields)
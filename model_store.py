@@ -0,0 +1,211 @@
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+from scipy import sparse
+
+from ann_index import IVFIndex
+from similarity_index import SimilarityIndex
+from svd_scorer import SVDScorer
+
+FORMAT_VERSION = 1
+
+
+class SavedTfidf:
+    # The fitted state of a TfidfVectorizer as loaded from disk. Serving only
+    # reads the similarity index and saving only needs vocabulary_ and idf_,
+    # so scikit-learn is imported when something actually transforms text.
+    def __init__(self, vocabulary, idf):
+        self.vocabulary_ = vocabulary
+        self.idf_ = idf
+        self._vectorizer = None
+
+    def vectorizer(self):
+        if self._vectorizer is None:
+            from sklearn.feature_extraction.text import TfidfVectorizer
+
+            vectorizer = TfidfVectorizer(stop_words='english', vocabulary=self.vocabulary_)
+            vectorizer.idf_ = self.idf_
+            self._vectorizer = vectorizer
+        return self._vectorizer
+
+    def transform(self, documents):
+        return self.vectorizer().transform(documents)
+
+
+class ModelStore:
+    # Each save writes a complete artifact directory next to the previous ones
+    # and then repoints CURRENT at it, so a reader never sees a half-written
+    # model. Arrays are plain .npy files that load with mmap_mode='r', letting
+    # every worker process share the same pages.
+    def __init__(self, directory):
+        self.directory = directory
+
+    @property
+    def current_path(self):
+        return os.path.join(self.directory, 'CURRENT')
+
+    def current_artifact(self):
+        try:
+            with open(self.current_path) as f:
+                name = f.read().strip()
+        except FileNotFoundError:
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.isdir(path) else None
+
+    def save(self, model, keep=2):
+        os.makedirs(self.directory, exist_ok=True)
+        name = f'model-{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}-{time.time_ns() % 10**6}'
+        path = os.path.join(self.directory, name)
+        tmp_path = path + '.tmp'
+        os.makedirs(tmp_path)
+
+        snapshot = model.snapshot
+        scorer = model.scorer
+        manifest = {
+            'format_version': FORMAT_VERSION,
+            'created_at': time.time(),
+            'data_version': list(snapshot.version),
+            'rating_count': model.trained_rating_count,
+            'svd_params': model.svd_params,
+            'train_rmse': model.train_rmse,
+            'movie_count': len(snapshot.movie_ids),
+            'svd': None,
+            'content': None,
+            'ann': None,
+        }
+        np.save(os.path.join(tmp_path, 'movie_ids.npy'), snapshot.movie_ids)
+
+        if scorer is not None:
+            # Copied under the scorer's lock: partial_fit may fold in a user or
+            # movie meanwhile, growing the factors and the id maps together.
+            with scorer.lock:
+                movie_ids, rows, catalog_qi, catalog_bi = scorer.bind_catalog(snapshot.movie_ids)
+                arrays = {
+                    'svd_pu': np.array(scorer.pu), 'svd_qi': np.array(scorer.qi),
+                    'svd_bu': np.array(scorer.bu), 'svd_bi': np.array(scorer.bi),
+                    'svd_user_ids': np.array(list(scorer.user_index)),
+                    'svd_item_ids': np.array(list(scorer.item_index)),
+                    'svd_catalog_rows': np.array(rows), 'svd_catalog_qi': np.array(catalog_qi),
+                    'svd_catalog_bi': np.array(catalog_bi),
+                }
+            self._save_arrays(tmp_path, arrays)
+            manifest['svd'] = {
+                'global_mean': scorer.global_mean,
+                'rating_scale': list(scorer.rating_scale),
+            }
+
+        if model.similarity_index is not None and model.content_movie_ids is snapshot.movie_ids:
+            tfidf_matrix = model.tfidf_matrix.tocsr()
+            index = model.similarity_index
+            self._save_arrays(tmp_path, {
+                'tfidf_data': tfidf_matrix.data,
+                'tfidf_indices': tfidf_matrix.indices,
+                'tfidf_indptr': tfidf_matrix.indptr,
+                'tfidf_idf': model.tfidf.idf_,
+                'similarity_neighbors': index.neighbors,
+                'similarity_scores': index.scores,
+            })
+            vocabulary = sorted(model.tfidf.vocabulary_, key=model.tfidf.vocabulary_.get)
+            with open(os.path.join(tmp_path, 'tfidf_vocabulary.json'), 'w') as f:
+                json.dump(vocabulary, f)
+            manifest['content'] = {'shape': list(tfidf_matrix.shape), 'k': index.k}
+
+        if model.ann_index is not None and model.ann_movie_ids is snapshot.movie_ids:
+            ann = model.ann_index
+            self._save_arrays(tmp_path, {
+                'ann_centroids': ann.centroids, 'ann_order': ann.order,
+                'ann_offsets': ann.offsets, 'ann_vectors': ann.vectors,
+            })
+            if ann.query_scale is not None:
+                self._save_arrays(tmp_path, {'ann_query_scale': ann.query_scale})
+            manifest['ann'] = {'n_probe': ann.n_probe, 'query_scale': ann.query_scale is not None}
+
+        with open(os.path.join(tmp_path, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.rename(tmp_path, path)
+
+        pointer_tmp = self.current_path + '.tmp'
+        with open(pointer_tmp, 'w') as f:
+            f.write(name)
+        os.replace(pointer_tmp, self.current_path)
+        self._prune(name, keep)
+        return path
+
+    def _save_arrays(self, path, arrays):
+        for name, array in arrays.items():
+            np.save(os.path.join(path, f'{name}.npy'), np.asarray(array))
+
+    def _prune(self, current, keep):
+        artifacts = sorted(
+            name for name in os.listdir(self.directory)
+            if name.startswith('model-') and not name.endswith('.tmp') and name != current
+        )
+        for name in artifacts[:max(0, len(artifacts) - (keep - 1))]:
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    def read_manifest(self):
+        path = self.current_artifact()
+        if path is None:
+            return None, None
+        return path, self.read_manifest_at(path)
+
+    def read_manifest_at(self, path):
+        with open(os.path.join(path, 'manifest.json')) as f:
+            return json.load(f)
+
+    def is_stale(self, manifest, snapshot, max_rating_drift):
+        return (
+            manifest.get('format_version') != FORMAT_VERSION
+            or manifest['data_version'][0] != snapshot.version[0]
+            or len(snapshot.ratings) - manifest['rating_count'] >= max_rating_drift
+        )
+
+    def load(self, path, manifest, movie_ids):
+        # Returns the pieces of a trained model bound to the given catalog
+        # array, so the recommender can compare catalogs by identity.
+        def array(name):
+            return np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+
+        artifact = {'scorer': None, 'tfidf': None, 'tfidf_matrix': None,
+                    'similarity_index': None, 'ann_index': None}
+
+        svd = manifest['svd']
+        if svd is not None:
+            scorer = SVDScorer(
+                array('svd_pu'), array('svd_qi'), array('svd_bu'), array('svd_bi'),
+                svd['global_mean'], array('svd_user_ids').tolist(), array('svd_item_ids').tolist(),
+                tuple(svd['rating_scale'])
+            )
+            scorer.seed_catalog(
+                movie_ids, array('svd_catalog_rows'), array('svd_catalog_qi'), array('svd_catalog_bi')
+            )
+            artifact['scorer'] = scorer
+
+        content = manifest['content']
+        if content is not None:
+            with open(os.path.join(path, 'tfidf_vocabulary.json')) as f:
+                vocabulary = {term: i for i, term in enumerate(json.load(f))}
+            artifact['tfidf'] = SavedTfidf(vocabulary, np.array(array('tfidf_idf')))
+            artifact['tfidf_matrix'] = sparse.csr_matrix(
+                (array('tfidf_data'), array('tfidf_indices'), array('tfidf_indptr')),
+                shape=tuple(content['shape'])
+            )
+            artifact['similarity_index'] = SimilarityIndex(
+                array('similarity_neighbors'), array('similarity_scores')
+            )
+
+        ann = manifest['ann']
+        if ann is not None:
+            artifact['ann_index'] = IVFIndex(
+                array('ann_centroids'), array('ann_order'), array('ann_offsets'),
+                array('ann_vectors'), ann['n_probe'],
+                array('ann_query_scale') if ann['query_scale'] else None
+            )
+        return artifact
+
+    def saved_movie_ids(self, path):
+        return np.load(os.path.join(path, 'movie_ids.npy'))
@@ -1,112 +1,624 @@
 import numpy as np
-import pandas as pd
-from surprise import SVD, Dataset, Reader
-from surprise.model_selection import train_test_split
-from surprise import accuracy
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from ann_index import IVFIndex, query_vector, recall_at_n
+from data_snapshot import DataSnapshot, SnapshotMetrics
+from model_bundle import ModelBundle, ModelNotReady
+from similarity_index import SimilarityIndex
+from cache import LRUCache
+from metrics import stage
+from svd_scorer import SVDScorer, top_k_indices
+
 
 class HybridRecommender:
-    def init(self, db_manager):
+    def __init__(self, db_manager, online_steps=5, online_lr=0.01, online_reg=0.02, retrain_after=500,
+                 similarity_top_k=50, ann_min_items=20000, ann_lists=None, ann_probe=8, ann_candidates=200,
+                 model_store=None, wave_half_life_days=7.0, wave_min_rating=4.0, cache_size=10000,
+                 warm_users=100, warm_n=10, training_mode='thread', svd_params=None, genre_weight=0.2):
         self.db = db_manager
-        self.svd_model = None
-        self.movies_df = None
-        self.ratings_df = None
-        self.tfidf_matrix = None
-        self.cosine_sim = None
-        
-    def load_data(self):
-        self.movies_df = self.db.get_all_movies()
-        self.ratings_df = self.db.get_all_ratings()
-        
-        self.movies_df['genres'] = self.movies_df['genres'].apply(
-            lambda x: ' '.join([str(g) for g in json.loads(x)]) if x else ''
-        )
+        self.model_store = model_store
+        self.model = ModelBundle()
+        self.publish_lock = threading.RLock()
+        self.content_lock = threading.Lock()
+        self.content_build = {'state': 'idle', 'runs': 0}
+        self.online_steps = online_steps
+        self.online_lr = online_lr
+        self.online_reg = online_reg
+        self.retrain_after = retrain_after
+        self.training_mode = training_mode
+        self.svd_params = dict(svd_params or {'n_factors': 100, 'n_epochs': 20})
+        self.retrain_lock = threading.Lock()
+        self.training = {'state': 'idle', 'runs': 0}
+        self.snapshot = None
+        self.snapshot_metrics = SnapshotMetrics()
+        self.snapshot_lock = threading.Lock()
+        self.wave_half_life_days = wave_half_life_days
+        self.wave_min_rating = wave_min_rating
+        self.similarity_top_k = similarity_top_k
+        self.ann_min_items = ann_min_items
+        self.ann_lists = ann_lists
+        self.ann_probe = ann_probe
+        self.ann_candidates = ann_candidates
+        self.genre_weight = genre_weight
+        # Results are keyed by model_version, which moves whenever a new model
+        # bundle is published; a user's entries are also dropped on their ratings.
+        self.model_version = 0
+        self.recommendation_cache = LRUCache(cache_size)
+        # Bumped on each of a user's ratings, so a result computed across one
+        # is not cached under a key that is still valid.
+        self.user_generations = {}
+        self.generation_lock = threading.Lock()
+        self.warm_users = warm_users
+        self.warm_n = warm_n
+        self.db.add_rating_listener(self.on_rating)
+    
+    @property
+    def scorer(self):
+        return self.model.scorer
+    
+    @property
+    def svd_model(self):
+        return self.model.svd_model
+    
+    @property
+    def trained_rating_count(self):
+        return self.model.trained_rating_count
+    
+    @property
+    def similarity_index(self):
+        return self.model.similarity_index
+    
+    @property
+    def ann_index(self):
+        return self.model.ann_index
+    
+    @property
+    def movies_df(self):
+        return self.snapshot.movies_df if self.snapshot else None
+    
+    @property
+    def ratings(self):
+        return self.snapshot.ratings if self.snapshot else None
+    
+    @property
+    def movie_ids(self):
+        return self.snapshot.movie_ids if self.snapshot else None
+    
+    def load_data(self, force=False):
+        version = self.db.get_data_version()
+        snapshot = self.snapshot
+        if snapshot is not None and not force and snapshot.version == version:
+            return snapshot
         
-    def train_collaborative(self):
+        with self.snapshot_lock:
+            snapshot = self.snapshot
+            if snapshot is not None and not force and snapshot.version == version:
+                return snapshot
+            
+            started = time.perf_counter()
+            with stage('data_load'):
+                if snapshot is None or force or snapshot.version[0] != version[0]:
+                    kind = 'full'
+                    snapshot = DataSnapshot.load(self.db, version, self.wave_half_life_days, self.wave_min_rating)
+                else:
+                    kind = 'incremental'
+                    snapshot = snapshot.with_new_ratings(self.db, version)
+            self.snapshot_metrics.record(kind, time.perf_counter() - started)
+            self.snapshot = snapshot
+        return snapshot
+    
+    def snapshot_stats(self):
+        return self.snapshot_metrics.report(self.snapshot)
+        
+    def training_settings(self):
+        return {
+            'online_steps': self.online_steps, 'online_lr': self.online_lr, 'online_reg': self.online_reg,
+            'retrain_after': self.retrain_after, 'similarity_top_k': self.similarity_top_k,
+            'ann_min_items': self.ann_min_items, 'ann_lists': self.ann_lists, 'ann_probe': self.ann_probe,
+            'ann_candidates': self.ann_candidates, 'wave_half_life_days': self.wave_half_life_days,
+            'wave_min_rating': self.wave_min_rating, 'svd_params': self.svd_params,
+        }
+    
+    def _fit_svd(self, snapshot):
+        # Fits on every rating so the served model has seen all the data;
+        # held-out quality is measured offline by evaluation.py. The RMSE
+        # returned here is in-sample and only useful for spotting a bad fit.
+        # Surprise is imported here, not at module level: a worker that loads
+        # a saved model never trains and never needs it.
+        from surprise import SVD, Dataset, Reader
+        
+        ratings = snapshot.ratings
         reader = Reader(rating_scale=(0.5, 5.0))
-        data = Dataset.load_from_df(
-            self.ratings_df[['user_id', 'movie_id', 'rating']], 
-            reader
+        data = Dataset.load_from_df(ratings.to_frame(), reader)
+        
+        svd_model = SVD(random_state=42, **self.svd_params)
+        svd_model.fit(data.build_full_trainset())
+        scorer = SVDScorer.from_model(svd_model)
+        
+        predictions = scorer.predict_pairs(ratings.user_ids.tolist(), ratings.movie_ids.tolist())
+        train_rmse = float(np.sqrt(np.mean((predictions - ratings.ratings.astype(np.float64)) ** 2)))
+        
+        return svd_model, scorer, train_rmse
+    
+    def _build_content(self, snapshot):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        
+        tfidf = TfidfVectorizer(stop_words='english')
+        tfidf_matrix = tfidf.fit_transform(
+            snapshot.movies_df['genres'] + ' ' + snapshot.movies_df['overview'].fillna('')
+        )
+        similarity_index = SimilarityIndex.build(tfidf_matrix, k=self.similarity_top_k)
+        return {'tfidf': tfidf, 'tfidf_matrix': tfidf_matrix, 'similarity_index': similarity_index}
+    
+    def _build_ann(self, scorer, movie_ids):
+        if scorer is None or movie_ids is None or len(movie_ids) < self.ann_min_items:
+            return None
+        return IVFIndex.from_scorer(scorer, movie_ids, n_lists=self.ann_lists, n_probe=self.ann_probe)
+    
+    def build_model(self, snapshot=None, content=True):
+        # Builds a complete bundle without touching the published one. With
+        # content=False the current content features are carried over when they
+        # were built for the same catalog.
+        snapshot = snapshot or self.load_data()
+        svd_model, scorer, train_rmse = self._fit_svd(snapshot)
+        current = self.model
+        if content:
+            content_parts = self._build_content(snapshot)
+        elif current.content_movie_ids is snapshot.movie_ids:
+            content_parts = {'tfidf': current.tfidf, 'tfidf_matrix': current.tfidf_matrix,
+                             'similarity_index': current.similarity_index}
+        else:
+            content_parts = {}
+        return ModelBundle(
+            snapshot, svd_model, scorer, len(snapshot.ratings),
+            ann_index=self._build_ann(scorer, snapshot.movie_ids), svd_params=dict(self.svd_params),
+            train_rmse=train_rmse, source='trained',
+            **content_parts
         )
+    
+    def publish(self, bundle):
+        # A new scorer first gets the ratings that arrived after its snapshot
+        # (online updates went to the old scorer), then one reference swap
+        # makes the whole bundle visible. record_rating takes the same lock, so
+        # no rating lands on the old scorer after the replay.
+        with self.publish_lock:
+            if bundle.scorer is not None and bundle.scorer is not self.model.scorer:
+                self.load_data()
+                self._replay_ratings(bundle.scorer, bundle.trained_rating_count)
+            self.model = bundle
+            self.model_changed()
+        return bundle
+    
+    def train_collaborative(self):
+        bundle = self.publish(self.build_model(content=False))
+        return bundle.train_rmse
+    
+    def _replay_ratings(self, scorer, trained_count):
+        missed = self.ratings.tail(trained_count)
+        for user_id, movie_id, rating in zip(missed.user_ids.tolist(), missed.movie_ids.tolist(),
+                                             missed.ratings.tolist()):
+            scorer.partial_fit(user_id, movie_id, rating,
+                               n_steps=self.online_steps, lr=self.online_lr, reg=self.online_reg)
+    
+    def save_model(self, bundle=None):
+        # Save a bundle before publishing it. Once published, its scorer also
+        # absorbs the replayed and online ratings past trained_rating_count,
+        # and a load would replay those a second time.
+        model = bundle or self.model
+        if self.model_store is None or model.snapshot is None:
+            return None
+        return self.model_store.save(model)
+    
+    def load_model(self, path=None):
+        # Without a path, loads the store's CURRENT artifact if it still
+        # matches the database; an explicit path (a just-trained artifact) is
+        # only checked against the catalog.
+        if self.model_store is None:
+            return False
+        snapshot = self.load_data()
+        if path is None:
+            path, manifest = self.model_store.read_manifest()
+            if manifest is None or self.model_store.is_stale(manifest, snapshot, self.retrain_after):
+                return False
+        else:
+            manifest = self.model_store.read_manifest_at(path)
+        if not np.array_equal(self.model_store.saved_movie_ids(path), snapshot.movie_ids):
+            return False
         
-        trainset, testset = train_test_split(data, test_size=0.2, random_state=42)
+        artifact = self.model_store.load(path, manifest, snapshot.movie_ids)
+        self.publish(ModelBundle(
+            snapshot, None, artifact['scorer'], manifest['rating_count'],
+            tfidf=artifact['tfidf'], tfidf_matrix=artifact['tfidf_matrix'],
+            similarity_index=artifact['similarity_index'], ann_index=artifact['ann_index'],
+            svd_params=manifest.get('svd_params'), train_rmse=manifest.get('train_rmse'), source='loaded'
+        ))
+        # Parameters tuned offline (evaluation.py --model-dir) carry over to
+        # later retrains.
+        if manifest.get('svd_params'):
+            self.svd_params = dict(manifest['svd_params'])
+        return True
+    
+    def boot(self):
+        # Startup path for every worker: use the saved artifact when it matches
+        # the database, otherwise start a background run that trains, saves
+        # for the next process and publishes; until then collaborative
+        # requests get ModelNotReady instead of waiting on the fit.
+        snapshot = self.load_data()
+        if self.load_model():
+            self.start_cache_warm()
+            return 'loaded'
+        if len(snapshot.ratings) == 0:
+            return 'empty'
+        self.start_training('boot')
+        return 'training'
+    
+    def current_model(self, content=False, collaborative=True):
+        # The published bundle, first re-bound to the current catalog if the
+        # movies table changed since it was built. Without a trained scorer,
+        # or without content features when content is asked for, it starts
+        # the background build and raises ModelNotReady rather than fitting
+        # in the request thread.
+        model, snapshot = self.model, self.snapshot
+        if model.scorer is None and collaborative:
+            if len(snapshot.ratings) > 0:
+                self.start_training('first_use')
+            raise ModelNotReady(self.training_status())
+        if model.scorer is not None and model.movie_ids is not snapshot.movie_ids:
+            with self.publish_lock:
+                model = self.model
+                if model.movie_ids is not snapshot.movie_ids:
+                    model = self.publish(model.replace(
+                        snapshot=snapshot, tfidf=None, tfidf_matrix=None, similarity_index=None,
+                        ann_index=self._build_ann(model.scorer, snapshot.movie_ids)
+                    ))
+        if content and model.content_movie_ids is not snapshot.movie_ids:
+            self.start_content_build()
+            raise ModelNotReady(self.training_status())
+        return model
+    
+    def build_ann_index(self):
+        with self.publish_lock:
+            model = self.model
+            bundle = self.publish(model.replace(ann_index=self._build_ann(model.scorer, model.movie_ids)))
+        return bundle.ann_index
+    
+    def ann_recall(self, user_ids=None, n=10, sample=100, n_probe=None):
+        model = self.model
+        if model.ann_index is None or model.movie_ids is not self.movie_ids:
+            return None
+        if user_ids is None:
+            user_ids = list(model.scorer.user_index)[:sample]
+        return recall_at_n(
+            model.scorer, model.ann_index, model.movie_ids, user_ids, n,
+            n_candidates=self.ann_candidates, n_probe=n_probe
+        )
+    
+    def record_rating(self, user_id, movie_id, rating):
+        ratings = self.load_data().ratings
+        with self.publish_lock:
+            model = self.model
+            scorer = model.scorer
+            if scorer is None:
+                return
+            
+            user_history = item_history = None
+            if user_id not in scorer.user_index:
+                user_history = ratings.user_history(user_id)
+            if movie_id not in scorer.item_index:
+                item_history = ratings.movie_history(movie_id)
+            with stage('online_update'):
+                scorer.partial_fit(user_id, movie_id, rating, user_history, item_history,
+                                   n_steps=self.online_steps, lr=self.online_lr, reg=self.online_reg)
+        # Again after the update: a request between add_rating and here may
+        # have cached a result from the user's old factors.
+        self.invalidate_user(user_id)
         
-        self.svd_model = SVD(n_factors=100, n_epochs=20, random_state=42)
-        self.svd_model.fit(trainset)
+        if len(ratings) - model.trained_rating_count >= self.retrain_after:
+            self.start_training('drift')
+    
+    def start_training(self, reason='manual'):
+        # Trains a fresh bundle in the background and publishes it when done;
+        # requests keep being served from the current bundle meanwhile.
+        with self.retrain_lock:
+            if self.training['state'] == 'running':
+                return False
+            self.training = {
+                'state': 'running', 'reason': reason, 'mode': self.training_mode,
+                'started_at': time.time(), 'runs': self.training['runs'] + 1,
+            }
+        threading.Thread(target=self._run_training, daemon=True).start()
+        return True
+    
+    def _run_training(self):
+        started = time.perf_counter()
+        result = {}
+        try:
+            with stage('training'):
+                if self.training_mode == 'process' and self.model_store is not None:
+                    path, train_rmse = self._train_in_process()
+                    if not self.load_model(path):
+                        raise RuntimeError('catalog changed while training; artifact discarded')
+                else:
+                    bundle = self.build_model(self.load_data())
+                    self.save_model(bundle)
+                    self.publish(bundle)
+                    train_rmse = bundle.train_rmse
+            self.start_cache_warm()
+            result = {'state': 'succeeded', 'train_rmse': train_rmse}
+        except Exception as e:
+            result = {'state': 'failed', 'error': str(e)}
+        finally:
+            with self.retrain_lock:
+                self.training = {
+                    **self.training, **result,
+                    'finished_at': time.time(), 'duration_s': round(time.perf_counter() - started, 3),
+                }
+    
+    def wait_for_training(self, timeout=None, interval=0.05):
+        # For scripts and benchmarks that need a published model before going
+        # on; request handlers never wait.
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            status = self.training_status()
+            if status['state'] != 'running' or (deadline is not None and time.monotonic() >= deadline):
+                return status
+            time.sleep(interval)
+    
+    def _train_in_process(self):
+        # A fresh interpreter does the fitting, outside this process's GIL and
+        # without a forked copy of the serving threads' locks.
+        worker = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'train_worker.py')
+        completed = subprocess.run(
+            [sys.executable, worker, '--db', self.db.db_path, '--model-dir', self.model_store.directory,
+             '--settings', json.dumps(self.training_settings())],
+            capture_output=True, text=True
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else
+                               f'training worker exited with {completed.returncode}')
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        return result['path'], result['train_rmse']
+    
+    def training_status(self):
+        with self.retrain_lock:
+            status = dict(self.training)
+            status['content'] = dict(self.content_build)
+        model = self.model
+        status['model'] = {
+            'version': self.model_version,
+            'source': model.source,
+            'created_at': model.created_at if model.scorer is not None else None,
+            'trained_rating_count': model.trained_rating_count,
+            'svd_params': model.svd_params,
+            'train_rmse': model.train_rmse,
+        }
+        return status
+    
+    def model_changed(self):
+        self.model_version += 1
+        self.recommendation_cache.clear()
+    
+    def on_rating(self, user_id, movie_id, rating):
+        self.invalidate_user(user_id)
+    
+    def invalidate_user(self, user_id):
+        with self.generation_lock:
+            self.user_generations[user_id] = self.user_generations.get(user_id, 0) + 1
+        return self.recommendation_cache.discard(lambda key: key[0] == user_id)
+    
+    def recommend(self, user_id, movie_id=None, n=10, alpha=0.5, genres=None):
+        snapshot = self.snapshot
+        if not movie_id:
+            alpha = None
+        genres = tuple(sorted(set(genres))) if genres else None
+        # The user's rating count in the snapshot ties the entry to their
+        # history, so ratings recorded by another worker (which never reach
+        # this process's invalidate_user) still miss once the snapshot
+        # reloads. The generation covers ratings landing during compute().
+        key = (user_id, movie_id, n, alpha, genres, self.model_version, snapshot.version[0],
+               len(snapshot.ratings.rows_for_user(user_id)))
+        generation = self.user_generations.get(user_id, 0)
         
-        predictions = self.svd_model.test(testset)
-        rmse = accuracy.rmse(predictions)
+        def compute():
+            if movie_id:
+                return self.hybrid_recommend(user_id, movie_id, n, alpha, genres)
+            return self.get_collaborative_recommendations(user_id, n, genres)
         
-        return rmse
+        return self.recommendation_cache.get_or_compute(
+            key, compute, lambda: self.user_generations.get(user_id, 0) == generation
+        )
+    
+    def start_cache_warm(self):
+        if not self.warm_users or self.model.scorer is None:
+            return False
+        threading.Thread(target=self.warm_cache, daemon=True).start()
+        return True
+    
+    def warm_cache(self):
+        # Precomputes the plain top-N for the most active users in one batched
+        # scoring pass, under the model version that was current at the start.
+        snapshot, model_version = self.snapshot, self.model_version
+        user_ids = snapshot.ratings.most_active_users(self.warm_users)
+        if not user_ids:
+            return 0
+        generations = {user_id: self.user_generations.get(user_id, 0) for user_id in user_ids}
+        results = self.get_collaborative_recommendations_batch(user_ids, self.warm_n)
+        if self.model_version != model_version:
+            return 0
+        warmed = 0
+        for user_id, recs in results.items():
+            if self.user_generations.get(user_id, 0) != generations[user_id]:
+                continue
+            rated = len(snapshot.ratings.rows_for_user(user_id))
+            self.recommendation_cache.put(
+                (user_id, None, self.warm_n, None, None, model_version, snapshot.version[0], rated), recs
+            )
+            warmed += 1
+        return warmed
+    
+    def cache_stats(self):
+        return {**self.recommendation_cache.stats(), 'model_version': self.model_version}
+    
+    def start_content_build(self):
+        # Single-flight like start_training: TF-IDF and the similarity index
+        # for the current catalog are built off the request path.
+        with self.retrain_lock:
+            if self.content_build['state'] == 'running':
+                return False
+            self.content_build = {'state': 'running', 'started_at': time.time(),
+                                  'runs': self.content_build['runs'] + 1}
+        threading.Thread(target=self._run_content_build, daemon=True).start()
+        return True
+    
+    def _run_content_build(self):
+        started = time.perf_counter()
+        try:
+            with stage('content_build'):
+                self.prepare_content_features()
+            result = {'state': 'succeeded'}
+        except Exception as e:
+            result = {'state': 'failed', 'error': str(e)}
+        with self.retrain_lock:
+            self.content_build = {**self.content_build, **result, 'finished_at': time.time(),
+                                  'duration_s': round(time.perf_counter() - started, 3)}
     
     def prepare_content_features(self):
-        tfidf = TfidfVectorizer(stop_words='english')
-        self.tfidf_matrix = tfidf.fit_transform(
-            self.movies_df['genres'] + ' ' + self.movies_df['overview'].fillna('')
-        )
-        self.cosine_sim = cosine_similarity(self.tfidf_matrix, self.tfidf_matrix)
+        # Single-flight: callers that arrive while a build is running wait for
+        # it and return its bundle instead of each fitting their own TF-IDF.
+        with self.content_lock:
+            snapshot = self.snapshot
+            model = self.model
+            if model.content_movie_ids is not None and model.content_movie_ids is snapshot.movie_ids:
+                return model
+            content = self._build_content(snapshot)
+            with self.publish_lock:
+                model = self.model
+                if model.movie_ids is not snapshot.movie_ids:
+                    model = model.replace(snapshot=snapshot,
+                                          ann_index=self._build_ann(model.scorer, snapshot.movie_ids))
+                return self.publish(model.replace(**content))
     
     def get_content_recommendations(self, movie_id, n=10):
-        if self.cosine_sim is None:
-            self.prepare_content_features()
+        model = self.current_model(content=True, collaborative=False)
         
-        idx = self.movies_df[self.movies_df['id'] == movie_id].index[0]
-        sim_scores = list(enumerate(self.cosine_sim[idx]))
-        sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)
-        sim_scores = sim_scores[1:n+1]
-        movie_indices = [i[0] for i in sim_scores]
+        idx = model.snapshot.movie_index[movie_id]
+        with stage('similarity_lookup'):
+            movie_indices, _ = model.similarity_index.lookup(idx, n)
         
-        return self.movies_df.iloc[movie_indices][['id', 'title', 'vote_average']]
+        return model.movies_df.iloc[movie_indices][['id', 'title', 'vote_average']]
     
-    def get_collaborative_recommendations(self, user_id, n=10):
-        if self.svd_model is None:
-            self.train_collaborative()
+    def get_collaborative_recommendations(self, user_id, n=10, genres=None):
+        model = self.current_model()
         
-        all_movies = self.movies_df['id'].tolist()
-        user_rated = self.ratings_df[self.ratings_df['user_id'] == user_id]['movie_id'].tolist()
-        unrated = [m for m in all_movies if m not in user_rated]
+        user_rated = self.ratings.user_movies(user_id)
         
-        predictions = []
-        for movie_id in unrated:
-            pred = self.svd_model.predict(user_id, movie_id)
-            predictions.append((movie_id, pred.est))
+        candidates = None
+        if genres:
+            # The genre bitmasks pre-filter the catalog; what passes is scored
+            # exactly, since an ANN shortlist may hold few matching movies.
+            candidates = np.flatnonzero(model.snapshot.genres.matching(genres))
+        elif model.ann_index is not None:
+            with stage('ann_search'):
+                candidates = model.ann_index.search(
+                    query_vector(model.scorer, user_id), self.ann_candidates + len(user_rated)
+                )
+        with stage('svd_scoring'):
+            top, _ = model.scorer.top_n(user_id, model.movie_ids, user_rated, n, candidates)
         
-        predictions.sort(key=lambda x: x[1], reverse=True)
-        top_movies = [p[0] for p in predictions[:n]]
+        return model.movies_df.iloc[top][['id', 'title', 'vote_average']]
+    
+    def get_collaborative_recommendations_batch(self, user_ids, n=10):
+        model = self.current_model()
+        
+        ratings = self.ratings
+        exclude = {uid: ratings.user_movies(uid) for uid in user_ids}
+        with stage('svd_scoring'):
+            results = model.scorer.top_n_batch(list(user_ids), model.movie_ids, exclude, n)
         
-        return self.movies_df[self.movies_df['id'].isin(top_movies)][['id', 'title', 'vote_average']]
+        return {
+            uid: model.movies_df.iloc[top][['id', 'title', 'vote_average']]
+            for uid, (top, _) in results.items()
+        }
     
-    def hybrid_recommend(self, user_id, movie_id=None, n=10, alpha=0.5):
-        if movie_id:
-            content_recs = self.get_content_recommendations(movie_id, n*2)
-            collab_recs = self.get_collaborative_recommendations(user_id, n*2)
-            
-            content_ids = set(content_recs['id'].tolist())
-            collab_ids = set(collab_recs['id'].tolist())
-            
-            hybrid_ids = list(content_ids.intersection(collab_ids))
-            
-            if len(hybrid_ids) < n:
-                remaining = n - len(hybrid_ids)
-                more_content = [m for m in content_ids if m not in hybrid_ids][:remaining//2]
-                more_collab = [m for m in collab_ids if m not in hybrid_ids][:remaining//2]
-                hybrid_ids.extend(more_content)
-hybrid_ids.extend(more_collab)
-            
-            return self.movies_df[self.movies_df['id'].isin(hybrid_ids[:n])]
+    def hybrid_recommend(self, user_id, movie_id=None, n=10, alpha=0.5, genres=None):
+        # alpha weights content similarity to movie_id against the user's SVD
+        # score. Content is TF-IDF similarity mixed with genre overlap
+        # (genre_weight), so candidates outside the TF-IDF neighbors still get
+        # a content score. Both sides are min-max scaled over one candidate
+        # set and ranked in a single pass; the frame comes back in rank order
+        # with its scores.
+        if not movie_id or movie_id not in self.snapshot.movie_index:
+            return self.get_collaborative_recommendations(user_id, n, genres)
+        try:
+            model = self.current_model(content=True)
+        except ModelNotReady:
+            # Content features are being rebuilt in the background; the
+            # collaborative ranking stands in until they are published.
+            if self.model.scorer is None:
+                raise
+            return self.get_collaborative_recommendations(user_id, n, genres)
+        movie_ids = model.movie_ids
+        idx = model.snapshot.movie_index.get(movie_id)
+        if idx is None:
+            return self.get_collaborative_recommendations(user_id, n, genres)
+        
+        with stage('similarity_lookup'):
+            neighbors, similarity = model.similarity_index.lookup(idx)
+        user_rated = self.ratings.user_movies(user_id)
+        movie_genres = model.snapshot.genres
+        
+        if genres:
+            candidates = np.flatnonzero(movie_genres.matching(genres))
+        elif model.ann_index is not None:
+            with stage('ann_search'):
+                shortlist = model.ann_index.search(
+                    query_vector(model.scorer, user_id), self.ann_candidates + len(user_rated)
+                )
+            candidates = np.union1d(neighbors, shortlist)
         else:
-            return self.get_collaborative_recommendations(user_id, n)
+            candidates = np.arange(len(movie_ids))
+        if len(candidates) == 0:
+            return model.movies_df.iloc[[]][['id', 'title', 'vote_average']]
+        
+        content = np.zeros(len(candidates))
+        pos = np.minimum(np.searchsorted(candidates, neighbors), len(candidates) - 1)
+        hit = candidates[pos] == neighbors
+        content[pos[hit]] = similarity[hit]
+        if self.genre_weight:
+            content = (1 - self.genre_weight) * content + self.genre_weight * movie_genres.overlap(idx)[candidates]
+        with stage('svd_scoring'):
+            collab = model.scorer.score_rows(user_id, movie_ids, candidates)
+        
+        blended = alpha * self._minmax(content) + (1 - alpha) * self._minmax(collab)
+        excluded = np.isin(movie_ids[candidates], user_rated) | (candidates == idx)
+        blended[excluded] = -np.inf
+        top = top_k_indices(blended, n)
+        
+        recs = model.movies_df.iloc[candidates[top]][['id', 'title', 'vote_average']].copy()
+        recs['score'] = blended[top]
+        recs['content_score'] = content[top]
+        recs['collab_score'] = collab[top]
+        return recs
+    
+    @staticmethod
+    def _minmax(values):
+        if len(values) == 0:
+            return np.zeros(0)
+        low, high = values.min(), values.max()
+        if high - low <= 0:
+            return np.zeros_like(values, dtype=np.float64)
+        return (values - low) / (high - low)
     
-    def get_brain_wave_recommendations(self, user_id, brain_wave_type, n=10):
-        wave_ratings = self.ratings_df[
-            (self.ratings_df['brain_wave_type'] == brain_wave_type) & 
-            (self.ratings_df['rating'] >= 4.0)
-        ]
+    def get_brain_wave_recommendations(self, user_id, brain_wave_type, n=10, trending=False):
+        snapshot = self.snapshot
+        top = snapshot.wave_popularity.top(brain_wave_type, n, trending)
         
-        if len(wave_ratings) > 0:
-            top_movies = wave_ratings.groupby('movie_id').size().sort_values(ascending=False).head(n).index
-            return self.movies_df[self.movies_df['id'].isin(top_movies)]
+        if len(top) > 0:
+            return snapshot.movies_df.iloc[top]
         else:
             return self.get_collaborative_recommendations(user_id, n)
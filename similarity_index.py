@@ -0,0 +1,58 @@
+import numpy as np
+
+
+class SimilarityIndex:
+    # Top-K cosine neighbours per movie, stored as (N, K) int32/float32
+    # arrays instead of the dense N x N similarity matrix. Only movies that
+    # share at least one term count as neighbours; the rest of a row is padded
+    # with -1.
+    def __init__(self, neighbors, scores):
+        self.neighbors = neighbors
+        self.scores = scores
+
+    @classmethod
+    def build(cls, features, k=50, block_size=256):
+        # features are expected L2-normalised (TfidfVectorizer's default), so a
+        # dot product is the cosine similarity. Only block_size x N scores are
+        # materialised at a time.
+        n = features.shape[0]
+        k = max(0, min(k, n - 1))
+        neighbors = np.full((n, k), -1, dtype=np.int32)
+        scores = np.zeros((n, k), dtype=np.float32)
+        if k == 0:
+            return cls(neighbors, scores)
+
+        features = features.astype(np.float32)
+        features_t = features.T.tocsr()
+        for start in range(0, n, block_size):
+            stop = min(start + block_size, n)
+            block = (features[start:stop] @ features_t).toarray()
+            rows = np.arange(stop - start)
+            block[rows, rows + start] = -np.inf
+
+            top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(block, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind='stable')
+            neighbors[start:stop] = np.take_along_axis(top, order, axis=1)
+            scores[start:stop] = np.take_along_axis(top_scores, order, axis=1)
+        unrelated = scores <= 0
+        neighbors[unrelated] = -1
+        scores[unrelated] = 0
+        return cls(neighbors, scores)
+
+    @property
+    def k(self):
+        return self.neighbors.shape[1]
+
+    @property
+    def nbytes(self):
+        return self.neighbors.nbytes + self.scores.nbytes
+
+    def lookup(self, idx, n=None):
+        neighbors = self.neighbors[idx]
+        scores = self.scores[idx]
+        valid = neighbors >= 0
+        neighbors, scores = neighbors[valid], scores[valid]
+        if n is not None:
+            neighbors, scores = neighbors[:n], scores[:n]
+        return neighbors, scores
@@ -0,0 +1,218 @@
+import threading
+
+import numpy as np
+
+
+def top_k_indices(scores, k):
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    order = np.argsort(-scores[candidates], kind='stable')
+    top = candidates[order]
+    return top[np.isfinite(scores[top])]
+
+
+class SVDScorer:
+    # Keeps the SVD factors as plain arrays so the whole catalog can be scored
+    # with one matrix-vector product instead of one predict() call per movie.
+    def __init__(self, pu, qi, bu, bi, global_mean, user_ids, item_ids, rating_scale=(0.5, 5.0)):
+        self.pu = pu
+        self.qi = qi
+        self.bu = bu
+        self.bi = bi
+        self.global_mean = float(global_mean)
+        self.rating_scale = rating_scale
+        self.user_index = {uid: i for i, uid in enumerate(user_ids)}
+        self.item_index = {iid: i for i, iid in enumerate(item_ids)}
+        self._catalog = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_model(cls, svd_model):
+        trainset = svd_model.trainset
+        user_ids = [trainset.to_raw_uid(i) for i in range(trainset.n_users)]
+        item_ids = [trainset.to_raw_iid(i) for i in range(trainset.n_items)]
+        return cls(
+            svd_model.pu, svd_model.qi, svd_model.bu, svd_model.bi,
+            trainset.global_mean, user_ids, item_ids, trainset.rating_scale
+        )
+
+    @property
+    def n_factors(self):
+        return self.qi.shape[1]
+
+    def bind_catalog(self, movie_ids):
+        # Item factors aligned to catalog order; movies the model has never
+        # seen get zero factors and zero bias, which matches Surprise falling
+        # back to the global mean (plus user bias) for unknown items.
+        cached = self._catalog
+        if cached is not None and cached[0] is movie_ids:
+            return cached
+        rows = np.fromiter(
+            (self.item_index.get(m, -1) for m in movie_ids), dtype=np.int64, count=len(movie_ids)
+        )
+        known = rows >= 0
+        catalog_qi = np.zeros((len(rows), self.n_factors))
+        catalog_bi = np.zeros(len(rows))
+        catalog_qi[known] = self.qi[rows[known]]
+        catalog_bi[known] = self.bi[rows[known]]
+        self._catalog = (movie_ids, rows, catalog_qi, catalog_bi)
+        return self._catalog
+
+    def seed_catalog(self, movie_ids, rows, catalog_qi, catalog_bi):
+        self._catalog = (movie_ids, rows, catalog_qi, catalog_bi)
+
+    def _ensure_writeable(self):
+        # Factors loaded from a model artifact are read-only memory maps shared
+        # between workers; the first online update takes a private copy.
+        if not self.pu.flags.writeable:
+            self.pu, self.bu = np.array(self.pu), np.array(self.bu)
+        if not self.qi.flags.writeable:
+            self.qi, self.bi = np.array(self.qi), np.array(self.bi)
+        cached = self._catalog
+        if cached is not None and not cached[2].flags.writeable:
+            self._catalog = (cached[0], np.array(cached[1]), np.array(cached[2]), np.array(cached[3]))
+
+    def user_vector(self, user_id):
+        u = self.user_index.get(user_id)
+        if u is None:
+            return np.zeros(self.n_factors), 0.0
+        return self.pu[u], self.bu[u]
+
+    def score_catalog(self, user_id, movie_ids):
+        _, _, catalog_qi, catalog_bi = self.bind_catalog(movie_ids)
+        pu, bu = self.user_vector(user_id)
+        scores = catalog_qi @ pu
+        scores += self.global_mean + bu
+        scores += catalog_bi
+        return np.clip(scores, *self.rating_scale, out=scores)
+
+    def score_catalog_batch(self, user_ids, movie_ids):
+        _, _, catalog_qi, catalog_bi = self.bind_catalog(movie_ids)
+        vectors = [self.user_vector(uid) for uid in user_ids]
+        pu = np.array([v[0] for v in vectors]).reshape(len(user_ids), self.n_factors)
+        bu = np.array([v[1] for v in vectors])
+        scores = pu @ catalog_qi.T
+        scores += (self.global_mean + bu)[:, None]
+        scores += catalog_bi[None, :]
+        return np.clip(scores, *self.rating_scale, out=scores)
+
+    def score_rows(self, user_id, movie_ids, rows):
+        _, _, catalog_qi, catalog_bi = self.bind_catalog(movie_ids)
+        pu, bu = self.user_vector(user_id)
+        scores = catalog_qi[rows] @ pu
+        scores += self.global_mean + bu
+        scores += catalog_bi[rows]
+        return np.clip(scores, *self.rating_scale, out=scores)
+
+    def predict_pairs(self, user_ids, movie_ids):
+        # predict() for aligned user/movie arrays in one pass. As in Surprise,
+        # an unknown user or item drops its bias and the factor term.
+        u = np.fromiter((self.user_index.get(x, -1) for x in user_ids), dtype=np.int64, count=len(user_ids))
+        i = np.fromiter((self.item_index.get(x, -1) for x in movie_ids), dtype=np.int64, count=len(movie_ids))
+        known_u, known_i = u >= 0, i >= 0
+        scores = np.full(len(u), self.global_mean)
+        scores[known_u] += self.bu[u[known_u]]
+        scores[known_i] += self.bi[i[known_i]]
+        both = known_u & known_i
+        scores[both] += np.einsum('ij,ij->i', self.pu[u[both]], self.qi[i[both]])
+        return np.clip(scores, *self.rating_scale, out=scores)
+
+    def top_n(self, user_id, movie_ids, exclude_ids=(), n=10, candidates=None):
+        # candidates restricts exact scoring to a shortlist of catalog rows,
+        # e.g. from an IVFIndex; returned indices are still catalog rows.
+        if candidates is None:
+            scores = self.score_catalog(user_id, movie_ids)
+            if len(exclude_ids):
+                scores[np.isin(movie_ids, exclude_ids)] = -np.inf
+            top = top_k_indices(scores, n)
+            return top, scores[top]
+
+        scores = self.score_rows(user_id, movie_ids, candidates)
+        if len(exclude_ids):
+            scores[np.isin(movie_ids[candidates], exclude_ids)] = -np.inf
+        top = top_k_indices(scores, n)
+        return candidates[top], scores[top]
+
+    def top_n_batch(self, user_ids, movie_ids, exclude_ids=None, n=10, chunk_size=256):
+        # exclude_ids maps user id -> already rated movie ids. Users are scored
+        # in chunks so the users x movies score block stays bounded.
+        exclude_ids = exclude_ids or {}
+        results = {}
+        for start in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[start:start + chunk_size]
+            scores = self.score_catalog_batch(chunk, movie_ids)
+            for row, uid in enumerate(chunk):
+                user_scores = scores[row]
+                rated = exclude_ids.get(uid, ())
+                if len(rated):
+                    user_scores[np.isin(movie_ids, rated)] = -np.inf
+                top = top_k_indices(user_scores, n)
+                results[uid] = (top, user_scores[top])
+        return results
+
+    def _fold_in(self, vectors, biases, ratings, reg):
+        # Ridge solve for a new row's factors and bias given the fixed factors
+        # on the other side of the ratings it has.
+        a = np.hstack([vectors, np.ones((len(vectors), 1))])
+        y = np.asarray(ratings, dtype=float) - self.global_mean - biases
+        w = np.linalg.solve(a.T @ a + reg * np.eye(a.shape[1]), a.T @ y)
+        return w[:-1], w[-1]
+
+    def fold_in_user(self, user_id, movie_ids, ratings, reg=0.02):
+        rows = np.array([self.item_index.get(m, -1) for m in movie_ids], dtype=np.int64)
+        known = rows >= 0
+        pu, bu = self._fold_in(self.qi[rows[known]], self.bi[rows[known]], np.asarray(ratings)[known], reg)
+        self.pu = np.vstack([self.pu, pu])
+        self.bu = np.append(self.bu, bu)
+        self.user_index[user_id] = len(self.bu) - 1
+        return self.user_index[user_id]
+
+    def fold_in_item(self, movie_id, user_ids, ratings, reg=0.02):
+        rows = np.array([self.user_index.get(u, -1) for u in user_ids], dtype=np.int64)
+        known = rows >= 0
+        qi, bi = self._fold_in(self.pu[rows[known]], self.bu[rows[known]], np.asarray(ratings)[known], reg)
+        self.qi = np.vstack([self.qi, qi])
+        self.bi = np.append(self.bi, bi)
+        self.item_index[movie_id] = len(self.bi) - 1
+        return self.item_index[movie_id]
+
+    def _refresh_catalog_item(self, movie_id, i):
+        cached = self._catalog
+        if cached is None:
+            return
+        movie_ids, rows, catalog_qi, catalog_bi = cached
+        positions = np.flatnonzero(movie_ids == movie_id)
+        rows[positions] = i
+        catalog_qi[positions] = self.qi[i]
+        catalog_bi[positions] = self.bi[i]
+
+    def partial_fit(self, user_id, movie_id, rating, user_history=None, item_history=None,
+                    n_steps=5, lr=0.01, reg=0.02):
+        # A few SGD steps on one (user, movie) pair using the same update rule
+        # as Surprise's SVD. Unknown users/movies are folded in first from
+        # their rating history, given as (ids, ratings) pairs.
+        with self.lock:
+            self._ensure_writeable()
+            u = self.user_index.get(user_id)
+            if u is None:
+                ids, ratings = user_history or ([movie_id], [rating])
+                u = self.fold_in_user(user_id, ids, ratings, reg)
+            i = self.item_index.get(movie_id)
+            if i is None:
+                ids, ratings = item_history or ([user_id], [rating])
+                i = self.fold_in_item(movie_id, ids, ratings, reg)
+
+            pu, qi = self.pu[u], self.qi[i]
+            for _ in range(n_steps):
+                err = rating - (self.global_mean + self.bu[u] + self.bi[i] + qi @ pu)
+                self.bu[u] += lr * (err - reg * self.bu[u])
+                self.bi[i] += lr * (err - reg * self.bi[i])
+                pu_old = pu.copy()
+                pu += lr * (err * qi - reg * pu)
+                qi += lr * (err * pu_old - reg * qi)
+            self._refresh_catalog_item(movie_id, i)
@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the repository root rather than in a package.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def seeded_db_path(tmp_path):
+    # A small reproducible catalog with ratings, for tests that train models.
+    from bulk_loader import bulk_insert_ratings, generate_movies, generate_ratings
+    from data_fetcher import TMDBFetcher
+    from database import DatabaseManager
+
+    path = str(tmp_path / 'movies.db')
+    db = DatabaseManager(path)
+    TMDBFetcher(db).save_movies_to_db(generate_movies(120, seed=1))
+    bulk_insert_ratings(db, generate_ratings(db.get_movie_ids(), 80, 15, seed=1))
+    db.close_all()
+    return path
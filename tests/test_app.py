@@ -0,0 +1,59 @@
+import pytest
+
+from app import create_app
+from config import Config
+
+
+@pytest.fixture
+def client(tmp_path):
+    class TestConfig(Config):
+        DATABASE_PATH = str(tmp_path / 'movies.db')
+        MODEL_DIR = str(tmp_path / 'models')
+        TRAINING_MODE = 'thread'
+        CACHE_WARM_USERS = 0
+        PROFILE_SLOW_MS = 0
+
+    return create_app(TestConfig).test_client()
+
+
+@pytest.mark.parametrize('cursor', ['abc', '1.5', 'x:1', '1.5:y'])
+def test_malformed_cursor_is_rejected(client, cursor):
+    response = client.get(f'/api/movies/popular?cursor={cursor}')
+    assert response.status_code == 400
+    assert 'cursor' in response.get_json()['error']
+
+
+def test_popular_movies_on_empty_catalog(client):
+    response = client.get('/api/movies/popular')
+    assert response.status_code == 200
+    assert response.get_json() == {'movies': [], 'next_cursor': None}
+
+
+@pytest.mark.parametrize('payload', [
+    {'user_id': 7, 'movie_id': 3},
+    {'user_id': 7, 'movie_id': 3, 'rating': 'x'},
+    {'user_id': 7, 'movie_id': 3, 'rating': float('nan')},
+    {'user_id': 7, 'movie_id': 3, 'rating': 5.5},
+    {'user_id': 7, 'movie_id': 3, 'rating': 0},
+    {'movie_id': 3, 'rating': 4.0},
+    {'user_id': '7', 'movie_id': 3, 'rating': 4.0},
+    {'user_id': True, 'movie_id': 3, 'rating': 4.0},
+    {'user_id': 7, 'movie_id': 3, 'rating': 4.0, 'brain_wave': 'omega'},
+])
+def test_invalid_rating_is_rejected_before_insert(client, payload):
+    response = client.post('/api/rate', json=payload)
+    assert response.status_code == 400
+    db = client.application.extensions['cinematic_brain'].get('db_manager')
+    assert db.count_ratings() == 0
+
+
+def test_malformed_rate_body_is_rejected(client):
+    response = client.post('/api/rate', data='not json', content_type='text/plain')
+    assert response.status_code == 400
+
+
+def test_valid_rating_is_stored(client):
+    response = client.post('/api/rate', json={'user_id': 7, 'movie_id': 3, 'rating': 4, 'brain_wave': 'beta'})
+    assert response.status_code == 200
+    db = client.application.extensions['cinematic_brain'].get('db_manager')
+    assert db.count_ratings() == 1
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from columnar import RatingStore
+from database import DatabaseManager
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'movies.db'))
+    db.migrate()
+    yield db
+    db.close_all()
+
+
+def test_load_skips_bad_legacy_rows(db):
+    rows = [
+        (1, 10, 4.0, 1000, 'alpha'),
+        (7, 3, None, 1000, 'alpha'),
+        (7, 3, 'x', 1000, 'beta'),
+        (None, 3, 4.0, 1000, 'beta'),
+        ('u', 3, 4.0, 1000, 'beta'),
+        (2, 11, '3.5', None, 'omega'),
+    ]
+    with db.transaction() as cursor:
+        cursor.executemany(
+            "INSERT INTO ratings (user_id, movie_id, rating, timestamp, brain_wave_type) VALUES (?, ?, ?, ?, ?)", rows
+        )
+
+    store, last_rowid = RatingStore.load(db, np.array([10, 11]))
+
+    assert last_rowid == len(rows)
+    assert store.user_ids.tolist() == [1, 2]
+    assert store.movie_ids.tolist() == [10, 11]
+    assert store.movie_rows.tolist() == [0, 1]
+    assert store.ratings.tolist() == [4.0, 3.5]
+    assert store.timestamps.tolist() == [1000, 0]
+    assert store.user_movies(2).tolist() == [11]
+
+
+def test_from_frame_drops_fractional_and_out_of_range_ids():
+    df = pd.DataFrame({
+        'user_id': [1, 1.5, 2 ** 40, 3],
+        'movie_id': [10, 10, 10, 10],
+        'rating': [4.0, 4.0, 4.0, float('inf')],
+        'brain_wave_type': ['alpha'] * 4,
+        'timestamp': [-5, 0, 0, 0],
+    })
+    store = RatingStore.from_frame(df, np.array([10]))
+    assert store.user_ids.tolist() == [1]
+    assert store.timestamps.tolist() == [0]
@@ -0,0 +1,27 @@
+import numpy as np
+
+from data_snapshot import DataSnapshot
+from database import DatabaseManager
+
+
+def test_incremental_snapshot_leaves_the_previous_one_unchanged(seeded_db_path):
+    db = DatabaseManager(seeded_db_path)
+    try:
+        old = DataSnapshot.load(db, (1, 1))
+        counts, decayed = old.wave_popularity.counts.copy(), old.wave_popularity.decayed.copy()
+        top = old.wave_popularity.top('alpha', n=10).tolist()
+        movie_id = int(old.movie_ids[-1])
+        for user_id in range(200_000, 200_050):
+            db.add_rating(user_id, movie_id, 5.0, 'alpha')
+
+        new = DataSnapshot.load(db, (1, 1)).wave_popularity
+        snapshot = old.with_new_ratings(db, (1, 2))
+        assert snapshot.wave_popularity is not old.wave_popularity
+        assert np.array_equal(old.wave_popularity.counts, counts)
+        assert np.array_equal(old.wave_popularity.decayed, decayed)
+        assert old.wave_popularity.top('alpha', n=10).tolist() == top
+        assert np.array_equal(snapshot.wave_popularity.counts, new.counts)
+        assert np.allclose(snapshot.wave_popularity.decayed, new.decayed)
+        assert snapshot.wave_popularity.top('alpha', n=1).tolist() == [len(old.movie_ids) - 1]
+    finally:
+        db.close_all()
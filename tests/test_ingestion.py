@@ -0,0 +1,104 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from ingestion import IngestionPipeline
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.path, self.headers.get('If-None-Match')))
+            failure = server.failures.pop(0) if server.failures else None
+        if failure is not None:
+            self.send_response(failure[0])
+            for name, value in failure[1].items():
+                self.send_header(name, value)
+            self.end_headers()
+            return
+        path = self.path.split('?')[0]
+        etag = f'"{path}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = json.dumps({'path': path, 'query': self.path.partition('?')[2]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.failures = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_pipeline(server, cache_dir=None, **kwargs):
+    host, port = server.server_address
+    return IngestionPipeline(f'http://{host}:{port}', 'key', cache_dir=cache_dir, rate_per_sec=1000,
+                             backoff=0.01, timeout=5, **kwargs)
+
+
+def test_retries_503_and_caps_retry_after(server):
+    server.failures = [(503, {'Retry-After': '3600'}), (503, {})]
+    pipeline = make_pipeline(server, max_backoff=0.05)
+
+    started = time.monotonic()
+    bodies = pipeline.fetch_many(['/movie/1'])
+    assert time.monotonic() - started < 5
+    assert bodies == [{'path': '/movie/1', 'query': 'api_key=key'}]
+    report = pipeline.last_stats.report()
+    assert report['requests'] == 3 and report['retries'] == 2 and report['errors'] == 0
+
+
+def test_gives_up_after_max_retries(server):
+    server.failures = [(503, {})] * 3
+    pipeline = make_pipeline(server, max_retries=2)
+
+    assert pipeline.fetch_many(['/movie/1']) == [None]
+    report = pipeline.last_stats.report()
+    assert report['requests'] == 3 and report['errors'] == 1 and report['pages'] == 0
+
+
+def test_revalidates_cached_pages_with_etag(server, tmp_path):
+    first = make_pipeline(server, str(tmp_path))
+    bodies = first.fetch_pages('/movie/popular', 3)
+    assert [body['query'] for body in bodies] == [f'page={page}&api_key=key' for page in (1, 2, 3)]
+    assert first.last_stats.report()['cache_hit_rate'] == 0
+    assert all(etag is None for _, etag in server.requests)
+
+    server.requests.clear()
+    second = make_pipeline(server, str(tmp_path))
+    assert second.fetch_pages('/movie/popular', 3) == bodies
+    report = second.last_stats.report()
+    assert report['not_modified'] == 3 and report['cache_hit_rate'] == 1.0
+    assert [etag for _, etag in server.requests] == ['"/movie/popular"'] * 3
+
+
+def test_fresh_cache_entries_skip_the_network(server, tmp_path):
+    make_pipeline(server, str(tmp_path)).fetch_pages('/movie/popular', 2)
+    server.requests.clear()
+
+    pipeline = make_pipeline(server, str(tmp_path), cache_max_age=3600)
+    pipeline.fetch_pages('/movie/popular', 4)
+    report = pipeline.last_stats.report()
+    assert report['pages'] == 4 and report['cache_hits'] == 2 and report['cache_hit_rate'] == 0.5
+    assert len(server.requests) == 2
@@ -0,0 +1,208 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from bulk_loader import generate_movies
+from data_fetcher import TMDBFetcher
+from database import DatabaseManager
+from model_bundle import ModelNotReady
+from model_store import ModelStore
+from recommender import HybridRecommender
+
+NEW_USER = 100_000
+
+
+@pytest.fixture
+def recommender(seeded_db_path):
+    db = DatabaseManager(seeded_db_path)
+    fetcher = TMDBFetcher(db)
+    recommender = HybridRecommender(db, warm_users=0, training_mode='thread', retrain_after=10 ** 6,
+                                    svd_params={'n_factors': 10, 'n_epochs': 10})
+    assert recommender.boot() == 'training'
+    assert recommender.wait_for_training(timeout=60)['state'] == 'succeeded'
+    recommender.fetcher = fetcher
+    yield recommender
+    db.close_all()
+
+
+def check_bundle(model):
+    # Every piece of a published bundle belongs to the same catalog. After a
+    # catalog change the re-bound bundle has no content until it is rebuilt,
+    # but it never carries content built for another catalog.
+    n_movies = len(model.movie_ids)
+    assert model.scorer is not None
+    assert len(model.movies_df) == n_movies
+    assert set(model.scorer.item_index) <= set(model.movie_ids.tolist())
+    if model.similarity_index is not None:
+        assert model.tfidf_matrix.shape[0] == n_movies
+        assert model.similarity_index.neighbors.shape[0] == n_movies
+    else:
+        assert model.tfidf_matrix is None
+
+
+def test_readers_never_see_a_torn_model(recommender):
+    user_ids = np.unique(recommender.ratings.user_ids).tolist()
+    errors, calls = [], [0]
+    stop = threading.Event()
+
+    def reader(seed):
+        rng = np.random.default_rng(seed)
+        while not stop.is_set():
+            try:
+                model = recommender.model
+                check_bundle(model)
+                catalog = set(model.movie_ids.tolist())
+                user_id = int(rng.choice(user_ids))
+                movie_id = int(rng.choice(model.movie_ids))
+                for recs in (recommender.recommend(user_id, n=5),
+                             recommender.recommend(user_id, movie_id, n=5, alpha=0.3),
+                             recommender.hybrid_recommend(user_id, movie_id, n=5)):
+                    assert len(recs) > 0
+                    assert set(recs['id'].tolist()) <= catalog | set(recommender.movie_ids.tolist())
+                calls[0] += 1
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+
+    threads = [threading.Thread(target=reader, args=(seed,)) for seed in range(6)]
+    for thread in threads:
+        thread.start()
+    try:
+        versions = [recommender.model_version]
+        for run in range(3):
+            if run == 1:
+                # A catalog change between runs exercises re-binding the
+                # published bundle while readers hold the old one.
+                recommender.fetcher.save_movies_to_db(generate_movies(10, seed=2, first_id=5000))
+                recommender.load_data(force=True)
+            assert recommender.start_training('test')
+            status = recommender.wait_for_training(timeout=60)
+            assert status['state'] == 'succeeded', status
+            versions.append(recommender.model_version)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    assert not errors, errors[:3]
+    assert calls[0] > 0
+    assert versions == sorted(set(versions))
+    check_bundle(recommender.prepare_content_features())
+    assert recommender.model.content_movie_ids is recommender.movie_ids
+
+
+def test_ratings_during_training_are_replayed(recommender):
+    # Holds the training run after it has fitted on its snapshot, records
+    # ratings, then lets it publish: the new scorer must include them.
+    fitted, release = threading.Event(), threading.Event()
+    fit_svd = recommender._fit_svd
+
+    def paused_fit(snapshot):
+        result = fit_svd(snapshot)
+        fitted.set()
+        assert release.wait(timeout=60)
+        return result
+
+    recommender._fit_svd = paused_fit
+    old_model = recommender.model
+    movie_ids = recommender.movie_ids[:5].tolist()
+    assert recommender.start_training('test')
+    assert fitted.wait(timeout=60)
+
+    db = recommender.db
+    for movie_id in movie_ids:
+        db.add_rating(NEW_USER, movie_id, 5.0, 'alpha')
+        recommender.record_rating(NEW_USER, movie_id, 5.0)
+    # The ratings went to the scorer that is still published.
+    assert recommender.model is old_model
+    assert NEW_USER in old_model.scorer.user_index
+
+    release.set()
+    assert recommender.wait_for_training(timeout=60)['state'] == 'succeeded'
+    model = recommender.model
+    assert model is not old_model
+    assert model.trained_rating_count == len(recommender.ratings) - len(movie_ids)
+    assert NEW_USER in model.scorer.user_index
+    predicted = model.scorer.predict_pairs([NEW_USER] * len(movie_ids), movie_ids)
+    assert (predicted > model.scorer.global_mean).all()
+
+
+def test_saved_model_excludes_replayed_ratings(recommender, seeded_db_path, tmp_path):
+    # The artifact is written before publish() replays the ratings that
+    # arrived during training, so a worker loading it replays them once.
+    recommender.model_store = ModelStore(str(tmp_path))
+    fitted, release = threading.Event(), threading.Event()
+    fit_svd = recommender._fit_svd
+
+    def paused_fit(snapshot):
+        result = fit_svd(snapshot)
+        fitted.set()
+        assert release.wait(timeout=60)
+        return result
+
+    recommender._fit_svd = paused_fit
+    movie_ids = recommender.movie_ids[:5].tolist()
+    assert recommender.start_training('test')
+    assert fitted.wait(timeout=60)
+    for movie_id in movie_ids:
+        recommender.db.add_rating(NEW_USER, movie_id, 5.0, 'alpha')
+        recommender.record_rating(NEW_USER, movie_id, 5.0)
+    release.set()
+    assert recommender.wait_for_training(timeout=60)['state'] == 'succeeded'
+
+    path, manifest = recommender.model_store.read_manifest()
+    assert manifest['rating_count'] == recommender.model.trained_rating_count
+    assert NEW_USER not in np.load(f'{path}/svd_user_ids.npy').tolist()
+
+    db = DatabaseManager(seeded_db_path)
+    try:
+        worker = HybridRecommender(db, warm_users=0, training_mode='thread', retrain_after=10 ** 6,
+                                   svd_params={'n_factors': 10, 'n_epochs': 10},
+                                   model_store=recommender.model_store)
+        assert worker.boot() == 'loaded'
+        live, loaded = recommender.model.scorer, worker.model.scorer
+        assert np.allclose(live.predict_pairs([NEW_USER] * len(movie_ids), movie_ids),
+                           loaded.predict_pairs([NEW_USER] * len(movie_ids), movie_ids))
+    finally:
+        db.close_all()
+
+
+def test_content_rebuild_runs_off_the_request_path(recommender):
+    # After a catalog change strips content from the bundle, hybrid requests
+    # fall back to the collaborative ranking while one background build runs.
+    started, release = threading.Event(), threading.Event()
+    build_content = recommender._build_content
+    builds = []
+
+    def paused_build(snapshot):
+        builds.append(snapshot)
+        started.set()
+        assert release.wait(timeout=60)
+        return build_content(snapshot)
+
+    recommender._build_content = paused_build
+    recommender.fetcher.save_movies_to_db(generate_movies(10, seed=2, first_id=5000))
+    recommender.load_data(force=True)
+    user_id = int(recommender.ratings.user_ids[0])
+    movie_id = int(recommender.movie_ids[0])
+
+    try:
+        for _ in range(5):
+            recs = recommender.hybrid_recommend(user_id, movie_id, n=5)
+            assert len(recs) == 5 and 'content_score' not in recs
+        with pytest.raises(ModelNotReady) as raised:
+            recommender.get_content_recommendations(movie_id)
+        assert raised.value.status['content']['state'] == 'running'
+        assert started.wait(timeout=60)
+    finally:
+        release.set()
+    deadline = time.monotonic() + 60
+    while recommender.training_status()['content']['state'] == 'running' and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert len(builds) == 1
+    assert recommender.training_status()['content']['state'] == 'succeeded'
+    assert 'content_score' in recommender.hybrid_recommend(user_id, movie_id, n=5)
+    check_bundle(recommender.model)
@@ -0,0 +1,19 @@
+import pytest
+
+from benchmarks import HOT_QUERIES, uses_index
+from database import DatabaseManager
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'movies.db'))
+    db.migrate()
+    yield db
+    db.close_all()
+
+
+@pytest.mark.parametrize('name', list(HOT_QUERIES))
+def test_hot_query_uses_its_index(db, name):
+    sql, params, index = HOT_QUERIES[name]
+    plan = db.explain_query_plan(sql, params)
+    assert uses_index(plan, index), plan
@@ -0,0 +1,60 @@
+import pytest
+
+from database import DatabaseManager
+from recommender import HybridRecommender
+
+USER = 7
+
+
+def worker(db_path):
+    recommender = HybridRecommender(DatabaseManager(db_path), warm_users=0, training_mode='thread',
+                                    retrain_after=10 ** 6, svd_params={'n_factors': 10, 'n_epochs': 10})
+    recommender.boot()
+    assert recommender.wait_for_training(timeout=60)['state'] == 'succeeded'
+    return recommender
+
+
+@pytest.fixture
+def recommender(seeded_db_path):
+    recommender = worker(seeded_db_path)
+    yield recommender
+    recommender.db.close_all()
+
+
+def test_rating_from_another_worker_misses_the_cache(recommender, seeded_db_path):
+    # Worker B's ratings never reach worker A's invalidate_user; A's cached
+    # list must still change once its snapshot has the rating.
+    top_pick = int(recommender.recommend(USER, n=5)['id'].iloc[0])
+    other = DatabaseManager(seeded_db_path)
+    other.add_rating(USER, top_pick, 1.0, 'alpha')
+    other.close_all()
+
+    recommender.load_data()
+    assert top_pick not in recommender.recommend(USER, n=5)['id'].tolist()
+
+
+def test_result_computed_across_a_rating_is_not_cached(recommender):
+    compute = recommender.get_collaborative_recommendations
+
+    def rated_while_computing(user_id, n=10, genres=None):
+        result = compute(user_id, n, genres)
+        # A rating lands after the miss but before the result is stored.
+        recommender.invalidate_user(user_id)
+        return result
+
+    recommender.get_collaborative_recommendations = rated_while_computing
+    recommender.recommend(USER, n=5)
+    assert len(recommender.recommendation_cache) == 0
+
+    recommender.get_collaborative_recommendations = compute
+    recommender.recommend(USER, n=5)
+    recommender.recommend(USER, n=5)
+    assert recommender.cache_stats()['hits'] == 1
+
+
+def test_warm_cache_entries_are_hit_by_recommend(recommender):
+    recommender.warm_users, recommender.warm_n = 5, 10
+    assert recommender.warm_cache() == 5
+    user_id = recommender.snapshot.ratings.most_active_users(1)[0]
+    recommender.recommend(user_id, n=10)
+    assert recommender.cache_stats()['hits'] == 1
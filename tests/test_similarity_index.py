@@ -0,0 +1,20 @@
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from similarity_index import SimilarityIndex
+
+
+def test_movies_without_shared_terms_are_not_neighbours():
+    features = TfidfVectorizer().fit_transform([
+        'space robot adventure', 'robot adventure', 'space opera', 'cooking documentary',
+    ])
+    index = SimilarityIndex.build(features, k=3, block_size=2)
+
+    assert index.neighbors.shape == (4, 3)
+    neighbors, scores = index.lookup(0)
+    assert sorted(neighbors.tolist()) == [1, 2]
+    assert (scores > 0).all()
+    assert index.lookup(1)[0].tolist() == [0]
+    neighbors, scores = index.lookup(3)
+    assert len(neighbors) == 0 and len(scores) == 0
+    assert (index.neighbors[3] == -1).all()
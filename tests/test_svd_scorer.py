@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+from surprise import SVD, Dataset, Reader
+
+from svd_scorer import SVDScorer
+
+UNKNOWN_USER = 10_000
+UNKNOWN_MOVIE = 20_000
+
+
+def fit(rating_scale=(0.5, 5.0)):
+    rng = np.random.default_rng(7)
+    ratings = pd.DataFrame({
+        'user_id': rng.integers(1, 41, 800),
+        'movie_id': rng.integers(1, 61, 800),
+        'rating': rng.choice(np.arange(0.5, 5.5, 0.5), 800),
+    }).drop_duplicates(['user_id', 'movie_id'])
+    data = Dataset.load_from_df(ratings, Reader(rating_scale=(0.5, 5.0)))
+    model = SVD(n_factors=8, n_epochs=10, random_state=0)
+    model.fit(data.build_full_trainset())
+    # Predictions are clipped to the trainset's scale; narrowing it makes
+    # sure clipping is exercised on both ends.
+    model.trainset.rating_scale = rating_scale
+    return model
+
+
+@pytest.fixture(scope='module', params=[(0.5, 5.0), (2.5, 3.0)], ids=['full_scale', 'clipped'])
+def model(request):
+    return fit(request.param)
+
+
+@pytest.fixture(scope='module')
+def catalog():
+    # Every trained movie plus one the model has never seen.
+    return np.append(np.arange(1, 61), UNKNOWN_MOVIE)
+
+
+def expected(model, user_id, movie_ids):
+    return np.array([model.predict(user_id, movie_id).est for movie_id in movie_ids])
+
+
+USERS = [1, 17, 40, UNKNOWN_USER]
+
+
+@pytest.mark.parametrize('user_id', USERS)
+def test_score_catalog_matches_predict(model, catalog, user_id):
+    scorer = SVDScorer.from_model(model)
+    np.testing.assert_allclose(scorer.score_catalog(user_id, catalog), expected(model, user_id, catalog),
+                               rtol=0, atol=1e-12)
+
+
+def test_score_catalog_batch_matches_predict(model, catalog):
+    scorer = SVDScorer.from_model(model)
+    scores = scorer.score_catalog_batch(USERS, catalog)
+    for row, user_id in enumerate(USERS):
+        np.testing.assert_allclose(scores[row], expected(model, user_id, catalog), rtol=0, atol=1e-12)
+
+
+def test_predict_pairs_matches_predict(model, catalog):
+    scorer = SVDScorer.from_model(model)
+    user_ids = np.repeat(USERS, len(catalog))
+    movie_ids = np.tile(catalog, len(USERS))
+    want = np.array([model.predict(u, m).est for u, m in zip(user_ids.tolist(), movie_ids.tolist())])
+    np.testing.assert_allclose(scorer.predict_pairs(user_ids.tolist(), movie_ids.tolist()), want,
+                               rtol=0, atol=1e-12)
+
+
+@pytest.mark.parametrize('user_id', USERS)
+def test_top_n_matches_predict_ranking(model, catalog, user_id):
+    scorer = SVDScorer.from_model(model)
+    excluded = catalog[::7]
+    top, scores = scorer.top_n(user_id, catalog, excluded, n=10)
+
+    want = expected(model, user_id, catalog)
+    want[np.isin(catalog, excluded)] = -np.inf
+    assert not np.isin(catalog[top], excluded).any()
+    np.testing.assert_allclose(scores, want[top], rtol=0, atol=1e-12)
+    # Ties (common once scores are clipped) may come back in any order, so
+    # compare the score of each rank rather than the movie ids.
+    np.testing.assert_allclose(scores, np.sort(want)[::-1][:10], rtol=0, atol=1e-12)
+
+
+def test_clipping_is_exercised(catalog):
+    model = fit((2.5, 3.0))
+    scores = SVDScorer.from_model(model).score_catalog_batch(USERS, catalog)
+    assert scores.min() == 2.5 and scores.max() == 3.0
@@ -0,0 +1,32 @@
+import argparse
+import json
+
+from database import DatabaseManager
+from model_store import ModelStore
+from recommender import HybridRecommender
+
+
+def train_model_artifact(db_path, model_dir, settings):
+    # Builds a complete bundle from the database and hands it back as a
+    # ModelStore artifact, which the serving process then maps in with mmap.
+    db = DatabaseManager(db_path)
+    recommender = HybridRecommender(db, model_store=ModelStore(model_dir), cache_size=1, warm_users=0, **settings)
+    bundle = recommender.build_model(recommender.load_data())
+    path = recommender.model_store.save(bundle)
+    db.close_all()
+    return path, bundle.train_rmse
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train a model artifact out of process')
+    parser.add_argument('--db', default='movies.db')
+    parser.add_argument('--model-dir', default='models')
+    parser.add_argument('--settings', default='{}', help='HybridRecommender keyword arguments as JSON')
+    args = parser.parse_args()
+
+    path, train_rmse = train_model_artifact(args.db, args.model_dir, json.loads(args.settings))
+    print(json.dumps({'path': path, 'train_rmse': train_rmse}))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+import numpy as np
+
+from svd_scorer import top_k_indices
+
+BRAIN_WAVES = ['alpha', 'beta', 'gamma', 'delta', 'theta']
+
+
+class WavePopularity:
+    # Per-wave counts of high ratings for every catalog row, plus an
+    # exponentially time-decayed version of the same counts. Decayed scores are
+    # kept relative to the newest timestamp seen (t_ref); ranking at any later
+    # time is unchanged because every movie decays by the same factor.
+    def __init__(self, n_movies, half_life_days=7.0, min_rating=4.0):
+        self.wave_index = {wave: i for i, wave in enumerate(BRAIN_WAVES)}
+        self.decay_rate = np.log(2) / (half_life_days * 86400)
+        self.min_rating = min_rating
+        self.counts = np.zeros((len(BRAIN_WAVES), n_movies), dtype=np.int64)
+        self.decayed = np.zeros((len(BRAIN_WAVES), n_movies))
+        self.t_ref = 0
+
+    @classmethod
+    def from_ratings(cls, ratings, n_movies, half_life_days=7.0, min_rating=4.0):
+        popularity = cls(n_movies, half_life_days, min_rating)
+        popularity.add_ratings(ratings)
+        return popularity
+
+    def copy(self):
+        popularity = WavePopularity.__new__(WavePopularity)
+        popularity.wave_index = self.wave_index
+        popularity.decay_rate = self.decay_rate
+        popularity.min_rating = self.min_rating
+        popularity.counts = self.counts.copy()
+        popularity.decayed = self.decayed.copy()
+        popularity.t_ref = self.t_ref
+        return popularity
+
+    def add_ratings(self, ratings):
+        # ratings is a RatingStore: wave codes index BRAIN_WAVES and movies
+        # come as catalog rows, negative when the movie is not in the catalog.
+        known = (ratings.ratings >= self.min_rating) & (ratings.waves < len(BRAIN_WAVES)) & (ratings.movie_rows >= 0)
+        if not known.any():
+            return
+        waves = ratings.waves[known].astype(np.int64)
+        movies = ratings.movie_rows[known].astype(np.int64)
+        timestamps = ratings.timestamps[known].astype(np.float64)
+
+        newest = timestamps.max()
+        if newest > self.t_ref:
+            self.decayed *= np.exp(-self.decay_rate * (newest - self.t_ref))
+            self.t_ref = newest
+        np.add.at(self.counts, (waves, movies), 1)
+        np.add.at(self.decayed, (waves, movies), np.exp(-self.decay_rate * (self.t_ref - timestamps)))
+
+    def top(self, wave, n=10, trending=False):
+        w = self.wave_index.get(wave)
+        if w is None:
+            return np.empty(0, dtype=np.int64)
+        scores = (self.decayed[w] if trending else self.counts[w]).astype(np.float64)
+        scores[self.counts[w] == 0] = -np.inf
+        return top_k_indices(scores, n)